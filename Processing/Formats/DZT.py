@@ -29,25 +29,34 @@ See Readme for detailed information
 """
 
 from Formats.header import *
+import os
+import sys
 import numpy as np
 from struct import pack, unpack
 from Toolbox.utils import bit, read_bit_range
 from Formats.tools import *
 
+# sample dtypes of DZT data_bits
+DZT_data_dtypes = {8: np.dtype('uint8'), 16: np.dtype('uint16'), 
+                   32: np.dtype('int32')}
+
 class DZT:
     'Class to parse binary .dzt format data from GSSI, Use .read()'
     'Binary file does not contain trace headers' 
-    def __init__(self, binary_file):
+    'lazy = True only reads the file header, traces through .iter_traces()'
+    'GSSI files are little-endian, byteorder = ">" reads swapped files'
+    def __init__(self, binary_file, lazy=False, byteorder='<'):
         self.binary_file = binary_file
+        self.byteorder = byteorder
         self.fileformat = 'su'
-        self._pos = 0
         self._band = 0
-        self._tracl = 0
-        self._trace_hdrs = []
+        self._trace_hdrs = HeaderTable()
         self.stream = []
-        # open file
+        self.channels = []
+        self.if_read = False
+        # open file, data is mapped from file by .read()
         with open(binary_file,'rb') as f: 
-            self.bin = f.read()
+            self.bin = f.read(1024)
         # assign zero headers for SU trace headers
         for field in SU_trace_header_format:
             setattr(self,field[2], 0)
@@ -55,72 +64,93 @@ class DZT:
         for field in DZT_trace_header_format:
             setattr(self,field[2], 0)
         # read data
-        self.read()
+        if lazy:
+            self._read_header()
+        else:
+            self.read()
 
     def _parse_trace_hdrs(self):
         'parse trace header data'
-        for field in DZT_trace_header_format:
-            # define variables based on input headerfield
-            length, start, name, bin_format = field
-            if bin_format == 'c':
-                setattr(self, name, "".join(
-                                   unpack('%s%s' % (str(length), bin_format),
-                                   self.bin[start:(start+length)])
-                                            ))
-            elif bin_format == 'x':
-                setattr(self, name, self.bin[start:(start+length)])
-            else:
-                setattr(
-                   self, name, unpack('%s' % (bin_format), 
-                   self.bin[start:(start+length)])[0]
-                       )
-
-    def _trace_data(self):
-        'parse data stream'
-        # define byte window
-        startbyte = self.data_offset + self._pos
-        endbyte = startbyte + self._band
-        # unpack data
-        data = unpack('%iH' % self.ns, 
-                   self.bin[startbyte:endbyte])
-        data = np.array(data)
-        self.dt = 1000*(self.range_ns / float(self.ns))
-        return data
+        for name, val in compile_header(DZT_trace_header_format, 
+                self.byteorder).unpack(self.bin).items():
+            setattr(self, name, val)
 
-    def read(self):
-        'reads header information and data for each trace into stream object'
+    def _read_header(self):
+        'reads file header information into SU header fields'
         # calculate header information
         self._parse_trace_hdrs()
-        # set date & time
-        self.year = 1980 + int(read_bit_range(self.date_c[3],1,7),2)
-        month = ( int((read_bit_range(self.date_c[3],0,0) + 
-                       read_bit_range(self.date_c[2],5,7)),2) )
-        self.day = int(read_bit_range(self.date_c[2],0,5),2)
-        self.day = month_ind[str(month)] + int(self.day)
-        self.hour = int(read_bit_range(self.date_c[1],3,7),2)
-        self.minute = ( int((read_bit_range(self.date_c[1],0,2) + 
-                        read_bit_range(self.date_c[0],5,7)),2) )
-        self.second = int(read_bit_range(self.date_c[0],0,4),2)       
+        # set date & time, date_c is a 32 bit word of the file byte order,
+        # DZT_date_format reads its bytes most significant first
+        date_c = self.date_c
+        if self.byteorder == '<' or (self.byteorder == '=' and 
+                                     sys.byteorder == 'little'):
+            date_c = date_c[::-1]
+        date = compile_header(DZT_date_format).unpack(date_c)
+        for name in ['year', 'hour', 'minute', 'second']:
+            setattr(self, name, date[name])
+        self.day = month_ind[str(date['month'])] + date['day']
         # define data band        
-        self._band = self.ns *(self.data_bits/8)
+        if self.data_bits not in DZT_data_dtypes:
+            raise ValueError('DZT data_bits %i not supported' % 
+                             self.data_bits)
+        self._dtype = DZT_data_dtypes[self.data_bits].newbyteorder(
+                                                             self.byteorder)
+        self._channels = max(self.channel_num, 1)
+        self._band = self.ns * self._dtype.itemsize
+        # data_offset < 1024 counts 1024 byte header blocks
+        if self.data_offset < 1024:
+            self._offset = 1024 * self.data_offset
+        else:
+            self._offset = 1024 * self._channels
+        self.traces = (max(os.path.getsize(self.binary_file) - self._offset, 0)
+                       // self._scan_dtype().itemsize)
         self.gelev = self.range
         self.selev = self.dia_const
-        while self._pos < (len(self.bin) - self._band):
-            # assign trace data to trace object file
-            self.stream += [self._trace_data()]
-            # increment trace header
-            self._tracl += 1
-            # setting header list
-            trace_hdr = []
-            for field in SU_trace_header_format:
-                length, start, name, binary_format = field
-                val = eval('self.' + name)
-                trace_hdr += [name, val]
-            self._trace_hdrs += [trace_hdr]
-            # shift byte window
-            self._pos += self._band
-
-        self.stream = np.array(self.stream, dtype='float32')
+        self.dt = 1000*(self.range_ns / float(self.ns))
+
+    def _scan_dtype(self):
+        'returns dtype of one scan of all channels'
+        return np.dtype((self._dtype, (self._channels, self.ns)))
+
+    def _header_table(self, traces, first=1):
+        '''returns header table of traces, header values are the same for all
+        traces except tracl starting at first'''
+        trace_hdrs = HeaderTable(traces)
+        for name in trace_hdrs.fields:
+            trace_hdrs[name] = getattr(self, name)
+        trace_hdrs['tracl'] = np.arange(first, first + traces)
+        return trace_hdrs
+
+    def read(self):
+        '''maps trace data of all channels from file, .channels holds a 
+        stream per channel and .stream the stream of the first channel'''
+        self._read_header()
+        self.if_read = True
+        scans = self.traces
+        if scans > 0:
+            # copy on write, changed samples are not written to file
+            data = np.memmap(self.binary_file, self._dtype, mode='c',
+                             offset=self._offset, 
+                             shape=(scans, self._channels, self.ns))
+        else:
+            data = np.zeros((0, self._channels, self.ns), self._dtype)
+        self.channels = [data[:, n] for n in range(self._channels)]
+        self.stream = self.channels[0]
+        self._trace_hdrs = self._header_table(scans)
+
+    def iter_traces(self, batch=1000, channel=0):
+        '''yields (header table, trace data) of up to batch traces of channel
+        at a time, unread files are read from disk one batch at a time'''
+        if self.if_read:
+            for traces in iter_batches(self._trace_hdrs, 
+                                       self.channels[channel], batch):
+                yield traces
+            return
+        first = 1
+        for data in iter_records(self.binary_file, self._scan_dtype(),
+                                 batch, self._offset):
+            yield self._header_table(len(data), first), data[:, channel]
+            first += len(data)
 
     # test for defined format string
     if 'args.fileformat' in globals():
@@ -128,19 +158,26 @@ class DZT:
 
     def write(self, outfile):
         'writes to file, format : su, seg2 or sgy'
+        if not self.if_read:
+            # lazy file, traces are streamed from disk one batch at a time
+            from Formats.convert import convert_stream
+            convert_stream(self, outfile, self.fileformat)
+            return
         write_binary(self._trace_hdrs, self.stream, self.fileformat, outfile)
 
     def header(self, field):
         'returns value for header field'
         return get_header(self._trace_hdrs, field)
 
-    def setheader(self, field, values):
+    def setheader(self, field, values, traces=None):
         '''changes header field(s). Set field name and value(s). Array of 
         values must = number of traces. Integer value is applied to all
-        traces. An array of two values is interpreted as ['tracl','value']''' 
-        set_header(self._trace_hdrs, field, values)
-
-    def zero(self, traces):
-        'zeros specified trace data.'
-        set_zero(self._trace_hdrs, self.stream, traces)
+        traces. An array of two values is interpreted as ['tracl','value']. 
+        opt. traces = list of tracl values the value(s) are applied to''' 
+        set_header(self._trace_hdrs, field, values, traces)
+
+    def zero(self, traces, mask=False):
+        '''zeros specified trace data. mask = True marks the traces dead and
+        zeros them when written, trace data is not changed'''
+        set_zero(self._trace_hdrs, self.stream, traces, mask)
 
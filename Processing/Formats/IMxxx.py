@@ -27,6 +27,7 @@ See Readme for detailed information
 
 """
 
+import os
 from Formats.header import *
 import numpy as np
 from struct import pack, unpack
@@ -39,109 +40,157 @@ header_ascii = {
     'IMX': [252, 112, 19],
     'IGX': [500, 112, 27] };
 
+Im_trace_header_formats = {
+    '81e': Im81e_trace_header_format,
+    '851': Im851_trace_header_format,
+    '852': Im852_trace_header_format };
+
 class Imagenix:
-    'Class to parse binary file format data from Imagenix'
-    def __init__(self, binary_file):
+    '''Class to parse binary file format data from Imagenix
+    lazy = True only reads the first header, pings through .iter_traces()'''
+    def __init__(self, binary_file, lazy=False):
         self.binary_file = binary_file
         self.fileformat = 'su'
         self.pos = 0
         self.band = 0
         self.tracl = 0
         self.stream = []
-        self.trace_hdrs = []
+        self.trace_hdrs = HeaderTable()
         self.text = []
+        self.if_read = False
         # open file
         with open(binary_file,'rb') as f: 
-            self.bin = f.read()
+            if lazy:
+                self.bin = f.read(header_ascii['IMX'][1])
+            else:
+                self.bin = f.read()
         # set Imagenix binary file format
         self._binff = "".join(unpack('3c', self.bin[0:3])).lower()
+        self._codec = compile_header(Im_trace_header_formats[self._binff])
+        # assign zero headers for reading Imaginex binaries
+        for field in Im_trace_header_formats[self._binff]:
+            setattr(self,field[2], None) 
         # assign zero headers for SU trace headers
         for field in SU_trace_header_format:
             setattr(self,field[2], 0)
-        # assign zero headers for reading Imaginex binaries
-        for field in eval('Im' + self._binff + '_trace_header_format'):
-            setattr(self,field[2], None) 
-        self.read()     
+        if lazy:
+            self._read_format()
+        else:
+            self.read()     
 
     def parse_trace_hdrs(self):
         'parse trace header information'
-        for field in eval('Im' + self._binff + '_trace_header_format'):
-            # define variables based on input header field
-            length, start, name, bin_format = field
-            start = int(start) + self.pos
-            if bin_format == 'c':
-                setattr(
-                   self, name, "".join(unpack('%s%s' % (length, bin_format),
-                   self.bin[start:(start+int(length))]))
-                       )
-            elif bin_format == 'b':
-                setattr(
-                   self, name, unpack('%s%s' % (length, bin_format), 
-                   self.bin[start:(start+int(length))])[0]
-                       )
-            elif bin_format[0] == 'x':
-                value = parse_bit_command(bin_format, 
-                                         self.bin[start:(start+int(length))])
-                setattr(self, name, value)
-
-    def trace_data(self):
-        'parse data stream'
-        # calculate header information
-        self.parse_trace_hdrs()
-        # define byte window
-        startbyte = self.pos + header_ascii[self.read_ascii_header][1]
-        endbyte = startbyte + (self.band)
-        # unpack data
-        data = np.array(unpack('%ib' % (endbyte - startbyte), 
-                        self.bin[startbyte:endbyte]))
-        # assign ns
-        self.ns = self.band
-        # calculate dt in ms water velocity of 1450m/s or file specified
-        if hasattr(self, 'water_velocity'):
-            if self.water_velocity == 0:
-                water_velocity = 1500
-            else:
-                water_velocity = self.water_velocity
+        for name, val in self._codec.unpack(self.bin, self.pos).items():
+            setattr(self, name, val)
+
+    def _sample_interval(self, hdrs):
+        '''returns dt in ms of each ping for water velocity of 1500m/s or
+        file specified'''
+        if self.ns == 0:
+            return 0
+        if 'water_velocity' in hdrs:
+            water_velocity = hdrs['water_velocity']
+            water_velocity = np.where(water_velocity == 0, 1500, 
+                                      water_velocity)
         else:
             water_velocity = 1500
-        self.dt = ( (float(self.range*2)/water_velocity) 
-                    / float(self.ns)*10**6 )      
-        return data
-
-    def read(self):
-        'reads header information and data for each trace into stream object'
+        return (hdrs['range']*2.0 / water_velocity) / float(self.ns)*10**6
+
+    def _parse_date(self, dates, times):
+        'returns dictionary of SU date & time arrays of date and time strings'
+        date = {}
+        # parse each distinct string once
+        times, inverse = np.unique(times, return_inverse=True)
+        values = np.array([map(int, time.split(':')) for time in times], 
+                          dtype='int64').reshape(-1, 3)
+        for n, name in enumerate(['hour', 'minute', 'second']):
+            date[name] = values[inverse, n]
+        dates, inverse = np.unique(dates, return_inverse=True)
+        values = []
+        for string in dates:
+            day, month, year = string.split("-")
+            values += [[int(year), month_ind[str(month_ind[month])] + int(day)]]
+        values = np.array(values, dtype='int64').reshape(-1, 2)
+        date['year'] = values[inverse, 0]
+        date['day'] = values[inverse, 1]
+        return date
+
+    def _read_format(self):
+        'defines ping data length and ping stride from the first header'
         # define band width
         self.read_ascii_header = "".join(unpack('3c', self.bin[100:103]))
         self.band= header_ascii[self.read_ascii_header][0]
+        self._stride = (header_ascii[self.read_ascii_header][1] + self.band
+                        + header_ascii[self.read_ascii_header][2] + 1)
+        # whole pings only, as read by _read_pings
+        self.traces = os.stat(self.binary_file).st_size // self._stride
+        # record of one ping, header fields + 8 bit echo data
+        self._dtype = trace_dtype(self.band, 
+                                  Im_trace_header_formats[self._binff], 'int8',
+                                  header_ascii[self.read_ascii_header][1],
+                                  self._stride)
 
-        # cycle through file 
-        while self.pos < len(self.bin):
-            # define headers and data
-            self.stream += [self.trace_data()]
-            # increment trace header
-            self.tracl += 1
-            # assign time
-            self.hour, self.minute, self.second = map(
-                                        int, self.time.split(':')
-                                                     )
-            # assign date
-            day, month, self.year = str(self.date).split("-")
-            self.year = int(self.year)
-            self.day = (month_ind[str(month_ind[month])] + int(day))
-            # capture text
-            self.text += [self.header_text]                           
-            # setting header list
-            trace_hdr = []
-            for field in SU_trace_header_format:
-                length, start, name, binary_format = field
-                val = eval('self.' + name)
-                trace_hdr += [name, val]
-            self.trace_hdrs += [trace_hdr]
-            # shift byte window
-            self.pos += (header_ascii[self.read_ascii_header][1] + self.band  
-                         +  header_ascii[self.read_ascii_header][2] + 1)
-            
-        self.stream = np.array(self.stream, dtype='float32')
+    def read(self):
+        'reads header information and data for each trace into stream object'
+        self._read_format()
+        self.trace_hdrs, self.stream, self.text = self._read_pings(self.bin)
+        self.if_read = True
+
+    def _read_pings(self, binary, first=1):
+        '''reads header information and data of all pings in binary string,
+        pings are numbered (tracl) from first'''
+        self.bin = binary
+        pings = len(binary) // self._stride
+        records = np.frombuffer(binary, self._dtype, pings)
+        raw = np.frombuffer(binary, 'uint8', pings*self._stride).reshape(
+                                                        pings, self._stride)
+        hdrs = dict((name, records[name]) for name in self._codec.names)
+        hdrs.update(self._codec.unpack_bits(raw[:, 0:self._codec.size]))
+        # header values of the last ping are kept as attributes
+        if pings > 0:
+            self.pos = (pings - 1)*self._stride
+            self.parse_trace_hdrs()
+        # assign ns, dt, trace numbers, date & time
+        self.ns = self.band
+        hdrs['ns'] = self.ns
+        hdrs['dt'] = self._sample_interval(hdrs)
+        hdrs['tracl'] = np.arange(first, first + pings)
+        self.tracl = first + pings - 1
+        hdrs.update(self._parse_date(records['date'], records['time']))
+        # setting header table
+        trace_hdrs = HeaderTable(pings)
+        for name in trace_hdrs.fields:
+            if name in hdrs:
+                trace_hdrs[name] = hdrs[name]
+            else:
+                trace_hdrs[name] = getattr(self, name)
+        if pings > 0:
+            for name in ['dt', 'hour', 'minute', 'second', 'year', 'day']:
+                setattr(self, name, np.asarray(hdrs[name]).flat[-1])
+        # capture text
+        length, start = [[field[0], field[1]] for field in 
+                         Im_trace_header_formats[self._binff]
+                         if field[2] == 'header_text'][0]
+        text = raw[:, start:start + length].tostring()
+        text = [text[n*length:(n + 1)*length] for n in range(pings)]
+        return trace_hdrs, records['data'].astype('float32'), text
+
+    def iter_traces(self, batch=1000):
+        '''yields (header table, trace data) of up to batch pings at a time,
+        unread files are read from disk one batch at a time'''
+        if self.if_read:
+            for traces in iter_batches(self.trace_hdrs, self.stream, batch):
+                yield traces
+            return
+        first = 1
+        with open(self.binary_file, 'rb') as f:
+            while True:
+                binary = f.read(batch * self._stride)
+                if len(binary) == 0:
+                    break
+                trace_hdrs, stream, text = self._read_pings(binary, first)
+                first += len(stream)
+                yield trace_hdrs, stream
 
     # test for defined format string
     if 'args.fileformat' in globals():
@@ -149,19 +198,26 @@ class Imagenix:
 
     def write(self, outfile):
         'writes to file, format : su, seg2 or sgy'
+        if not self.if_read:
+            # lazy file, traces are streamed from disk one batch at a time
+            from Formats.convert import convert_stream
+            convert_stream(self, outfile, self.fileformat)
+            return
         write_binary(self.trace_hdrs, self.stream, self.fileformat, outfile)
 
     def header(self, field):
         'returns value for header field'
         return get_header(self.trace_hdrs, field)
 
-    def setheader(self, field, values):
+    def setheader(self, field, values, traces=None):
         '''changes header field(s). Set field name and value(s). Array of 
         values must = number of traces. Integer value is applied to all
-        traces. An array of two values is interpreted as ['tracl','value']''' 
-        set_header(self.trace_hdrs, field, values)
-
-    def zero(self, traces):
-        'zeros specified trace data.'
-        set_zero(self.trace_hdrs, self.stream, traces)
+        traces. An array of two values is interpreted as ['tracl','value']. 
+        opt. traces = list of tracl values the value(s) are applied to''' 
+        set_header(self.trace_hdrs, field, values, traces)
+
+    def zero(self, traces, mask=False):
+        '''zeros specified trace data. mask = True marks the traces dead and
+        zeros them when written, trace data is not changed'''
+        set_zero(self.trace_hdrs, self.stream, traces, mask)
 
@@ -28,42 +28,148 @@ See Readme for detailed information
 """
 
 from Formats.header import *
+import mmap
 import numpy as np
 from struct import pack, unpack
 from Toolbox.utils import bit, read_bit_range
 from Formats.tools import *
+
+# sample dtypes of SEG2 data format codes
+SEG2_data_dtypes = {1: np.dtype('int16'), 2: np.dtype('int32'),
+                    4: np.dtype('float32'), 5: np.dtype('float64')}
+
+# 20 bit SEG-D sample group, 4 exponents and 4 mantissas in 10 bytes
+SEGD20_dtype = np.dtype([('exponents', 'u2'), ('mantissas', 'i2', 4)])
+SEGD20_shifts = np.array([12, 8, 4, 0], dtype='u2')
+
+def decode_segd20(binary, ns, offset=0, byteorder='='):
+    '''returns ns samples of 20 bit SEG-D data in binary starting at offset 
+    as float32 array'''
+
+    # INFO:
+    # SEG2 data format 3 packs groups of 4 samples into 10 bytes, one 16 bit
+    # word holding the 4 bit exponents of the 4 samples (first sample in the
+    # high nibble) followed by the 4 16 bit two's complement mantissas.
+    # sample = mantissa * 2**(exponent - 15)
+    #
+    # Input : binary string, number of samples, opt. offset in bytes,
+    #         byteorder of the 16 bit words
+    # Output : numpy float32 array of samples
+    #
+    # added: 18/10/26
+
+    groups = np.frombuffer(binary, SEGD20_dtype.newbyteorder(byteorder),
+                           -(-ns // 4), offset)
+    exponents = (groups['exponents'][:, None] >> SEGD20_shifts) & 0xf
+    return np.ldexp(groups['mantissas'].astype('float32'),
+                    exponents.astype('int32') - 15).ravel()[:ns]
                   
 class SEG2:
-    'Class to parse binary SEG2 format data from Geometrics, Use .read()'
-    def __init__(self, binary_file):
+    '''Class to parse binary SEG2 format data from Geometrics, Use .read()
+    lazy = True only reads the file header and trace pointers, traces are 
+    decoded on first access of .stream and kept in a cache of cache_bytes.
+    byteorder '<' or '>' is taken from the file descriptor block id if not
+    given'''
+    def __init__(self, binary_file, lazy=False, cache_bytes=64*2**20,
+                 byteorder=None):
+        self.binary_file = binary_file
+        self.byteorder = byteorder
         self.fileformat = 'su'
         self.band = 0
         self.tracl = 0
-        self.trace_hdrs = []
+        self.trace_hdrs = HeaderTable()
         self.hdr = None
         self.stream = []
-        # open file
-        f = open(binary_file,'rb') 
-        self.bin = f.read()
-        f.close()
+        self.if_read = False
+        self._map = None
         # assign zero headers for SU trace headers
         for field in SU_trace_header_format:
             setattr(self,field[2], 0)
         # assign SEG2 header fields
         for field in SEG2_trace_header_format:
             setattr(self,field[3], field[4])
-        # assign file variables
-        self.traces = unpack('H',self.bin[6:8])[0]
-        # read data
-        self.read()
+        if lazy:
+            self._read_file_block()
+            self.read_file_header(unpack(self.byteorder + 'H',
+                                         self.bin[4:6])[0]+32)
+            with open(binary_file, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.stream = LazyStream(self.traces, self._decode_trace, 
+                                     cache_bytes)
+        else:
+            # open file
+            f = open(binary_file,'rb') 
+            self.bin = f.read()
+            f.close()
+            # assign file variables
+            self._set_byteorder()
+            self.traces = unpack(self.byteorder + 'H',self.bin[6:8])[0]
+            if len(self.bin) < 32 + 4*self.traces:
+                raise ValueError('truncated SEG2 file %s' % self.binary_file)
+            self.pointers = unpack(self.byteorder + '%ii' % self.traces, 
+                                   self.bin[32:32 + 4*self.traces])
+            # read data
+            self.read()
+
+    def _set_byteorder(self):
+        'sets byteorder of the file descriptor block id 3a55 Hex'
+        if len(self.bin) < 32:
+            # empty or truncated file descriptor block
+            raise ValueError('not a SEG2 file %s' % self.binary_file)
+        if self.byteorder is None:
+            self.byteorder = detect_byteorder(self.bin, 0, 'H',
+                                              lambda block_id: 
+                                              block_id == 0x3a55)
+            if self.byteorder is None:
+                raise ValueError('not a SEG2 file %s' % self.binary_file)
+
+    def _read_file_block(self):
+        'reads file descriptor block up to the first trace from file'
+        with open(self.binary_file, 'rb') as f:
+            self.bin = f.read(32)
+            self._set_byteorder()
+            self.traces = unpack(self.byteorder + 'H',self.bin[6:8])[0]
+            # trace pointer sub-block
+            self.bin += f.read(unpack(self.byteorder + 'H',
+                                      self.bin[4:6])[0])
+            if len(self.bin) < 32 + 4*self.traces:
+                raise ValueError('truncated SEG2 file %s' % self.binary_file)
+            self.pointers = unpack(self.byteorder + '%ii' % self.traces, 
+                                   self.bin[32:32 + 4*self.traces])
+            if self.traces > 0:
+                self.bin += f.read(min(self.pointers) - len(self.bin))
+
+    def close(self):
+        '''closes the file map of a lazy file, traces not yet decoded can no
+        longer be read'''
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _read_trace_block(self, f, trace_index):
+        'reads trace descriptor and data block of a trace from open file'
+        f.seek(trace_index)
+        sizes = f.read(8)
+        f.seek(trace_index)
+        return f.read(unpack(self.byteorder + 'H', sizes[2:4])[0] + 
+                      unpack(self.byteorder + 'i', sizes[4:8])[0])
         
-    def read_file_header(self, hdr_pointer):
+    def read_file_header(self, hdr_pointer, binary=None):
+        if binary is None:
+            binary = self.bin
         in_header = True
         while in_header:
-            length = unpack('H',self.bin[hdr_pointer:hdr_pointer+2])[0]
+            length = unpack(self.byteorder + 'H',
+                            binary[hdr_pointer:hdr_pointer+2])[0]
             if length > 0:
                 string = "".join(unpack('%sc' % str(length-3),
-                         self.bin[
+                         binary[
                          hdr_pointer+2:hdr_pointer+length-1
                                  ])).split(" ")
                 # seperate "NOTE:" section into variables
@@ -103,113 +209,134 @@ class SEG2:
         'parse header info and trace data into header and stream objects'
 
         # read main file headers such as date & time'
-        self.read_file_header(unpack('H',self.bin[4:6])[0]+32)
+        self.read_file_header(unpack(self.byteorder + 'H',
+                                     self.bin[4:6])[0]+32)
         self.if_read = True
+        self.trace_hdrs = HeaderTable(self.traces)
 
         # parse trace header information'
         for i in range(self.traces):
-            trace_index=unpack('i',self.bin[
-                       32+i*4:32+i*4+4])[0]
-            # Reading Trace...
-            # defining length of header variables
-            string_header_block = unpack(
-                         'H',self.bin[(trace_index+2):(trace_index+4)])[0]
-            Trace_pointer = trace_index + 32
-
-            # parse header variables and write to list
-            self.read_file_header(Trace_pointer)
-            
-            # defining data block length 
-            data_block = unpack(
-                      'i',self.bin[(trace_index+4):(trace_index+8)]
-                               )[0] 
-            data_block_start = trace_index + string_header_block
-            data_block_end = data_block_start + data_block
-
-            # defining data type & length
-            data_type = unpack(
-                       'b',self.bin[(trace_index+12):(trace_index+13)]
-                               )[0]
-            if data_type == 1 :
-                length = 2
-                data_char = 'H'
-            elif data_type == 2 :
-                length = 4
-                data_char = 'I'
-            elif data_type == 3 :
-                print("20 bit SEG-D data format not supported")
-                break
-            elif data_type == 4 :
-                length = 4
-                data_char = 'f'
-            elif data_type == 5 :
-                length = 8
-                data_char = 'd'
-
-            data_pointer = data_block_start
-            data=[]
-            # parse data variables
-            while data_pointer < data_block_end:
-                sample=unpack('%s' % data_char,
-                     self.bin[data_pointer:data_pointer + length]
-                             )[0]
-                data_pointer+=length
-                data+=[sample]
-
-            data=np.array(data, dtype='float32')
-            self.stream += [data]
-
-            # assign ns
-            self.ns = unpack(
-                      'i',self.bin[(trace_index+8):(trace_index+12)]
-                               )[0]
-            # assign scale for locations
-            self.scalco = 100
-
-            # assign Date/Time
-            date = self.ACQUISITION_DATE.split("/")
-            self.day = month_ind[str(month_ind[date[1]])]+ int(date[0])
-            self.year = int(date[2])
-            time = self.ACQUISITION_TIME.split(":")
-            self.hour = int(time[0])
-            self.minute = int(time[1])
-            self.second = int(time[2])
-
-            # assign data_type
-            self.data_format = unpack(
-                      'b',self.bin[(trace_index+12):(trace_index+13)]
-                               )[0]
-
-            # assign header values 
-            self.assign_header_values('su')
-
-            # make list and binary headers
-            trace_hdr = []
-            for field in SU_trace_header_format:
-                length, start, name, bin_format = field
-                val = eval('self.' + name)
-                trace_hdr += [name, val]
-            self.trace_hdrs += [trace_hdr]
+            self.stream += [self._read_trace(self.bin, self.pointers[i])]
+
+            # set header table
+            self.trace_hdrs.fill(i, self)
 
         # test for defined format string
         if 'args.fileformat' in globals():
             self.setformat(args.fileformat)
 
+    def _read_trace(self, binary, trace_index):
+        '''parse header info of trace at trace_index of binary string into
+        header fields and return trace data'''
+        self._read_trace_header(binary, trace_index)
+        return self._decode_samples(binary, 
+                                    *self._trace_block(binary, trace_index))
+
+    def _trace_block(self, binary, trace_index):
+        '''returns data type, start, length in bytes and number of samples 
+        of the data block of trace at trace_index'''
+        string_header_block, data_block, ns = unpack(
+                     self.byteorder + 'Hii',
+                     binary[(trace_index+2):(trace_index+12)])
+        data_type = unpack(
+                   'b',binary[(trace_index+12):(trace_index+13)]
+                           )[0]
+        return data_type, trace_index + string_header_block, data_block, ns
+
+    def _decode_samples(self, binary, data_type, start, data_block, ns):
+        'returns samples of data block as float32 array'
+        if data_type == 3:
+            return decode_segd20(binary, ns, start, self.byteorder)
+        if data_type not in SEG2_data_dtypes:
+            raise ValueError('SEG2 data format %i not supported' % data_type)
+        dtype = SEG2_data_dtypes[data_type].newbyteorder(self.byteorder)
+        return np.frombuffer(binary, dtype, data_block // dtype.itemsize, 
+                             start).astype('float32')
+
+    def _decode_trace(self, n):
+        'decodes data of trace n from the memory mapped file'
+        if self._map is None:
+            raise ValueError('SEG2 file %s is closed' % self.binary_file)
+        return self._decode_samples(self._map, 
+                                    *self._trace_block(self._map, 
+                                                       self.pointers[n]))
+
+    def _read_headers(self):
+        'parse trace headers of a lazy file without decoding trace data'
+        if self._map is None or len(self.trace_hdrs) == self.traces:
+            return
+        self.trace_hdrs = HeaderTable(self.traces)
+        for i in range(self.traces):
+            self._read_trace_header(self._map, self.pointers[i])
+            self.trace_hdrs.fill(i, self)
+
+    def _read_trace_header(self, binary, trace_index):
+        '''parse header info of trace at trace_index of binary string into
+        header fields'''
+        # parse header variables and write to list
+        self.read_file_header(trace_index + 32, binary)
+        data_type = self._trace_block(binary, trace_index)[0]
+
+        # assign ns
+        self.ns = unpack(
+                  self.byteorder + 'i',binary[(trace_index+8):(trace_index+12)]
+                           )[0]
+        # assign scale for locations
+        self.scalco = 100
+
+        # assign Date/Time
+        date = self.ACQUISITION_DATE.split("/")
+        self.day = month_ind[str(month_ind[date[1]])]+ int(date[0])
+        self.year = int(date[2])
+        time = self.ACQUISITION_TIME.split(":")
+        self.hour = int(time[0])
+        self.minute = int(time[1])
+        self.second = int(time[2])
+
+        # assign data_type
+        self.data_format = data_type
+
+        # assign header values 
+        self.assign_header_values('su')
+
+    def iter_traces(self, batch=1000):
+        '''yields (header table, trace data) of up to batch traces at a time,
+        unread files are read from disk one batch at a time'''
+        if self.if_read:
+            for traces in iter_batches(self.trace_hdrs, self.stream, batch):
+                yield traces
+            return
+        with open(self.binary_file, 'rb') as f:
+            for start in range(0, self.traces, batch):
+                trace_hdrs = HeaderTable(min(batch, self.traces - start))
+                stream = []
+                for i in range(len(trace_hdrs)):
+                    stream += [self._read_trace(self._read_trace_block(
+                                         f, self.pointers[start + i]), 0)]
+                    trace_hdrs.fill(i, self)
+                yield trace_hdrs, stream
+
     def write(self,outfile):
         'writes to file, format : su, seg2 or sgy; IEEE 32 bit floats'
+        self._read_headers()
         write_binary(self.trace_hdrs, self.stream, self.fileformat, outfile)
 
     def header(self, field):
         'returns value for header field'
+        self._read_headers()
         return get_header(self.trace_hdrs, field)
 
-    def setheader(self, field, values):
+    def setheader(self, field, values, traces=None):
         '''changes header field(s). Set field name and value(s). Array of 
         values must = number of traces. Integer value is applied to all
-        traces. An array of two values is interpreted as ['tracl','value']''' 
-        set_header(self.trace_hdrs, field, values)
+        traces. An array of two values is interpreted as ['tracl','value']. 
+        opt. traces = list of tracl values the value(s) are applied to''' 
+        self._read_headers()
+        set_header(self.trace_hdrs, field, values, traces)
 
-    def zero(self, traces):
-        'zeros specified trace data.'
-        set_zero(self.trace_hdrs, self.stream, traces)
+    def zero(self, traces, mask=False):
+        '''zeros specified trace data. mask = True marks the traces dead and
+        zeros them when written, trace data is not changed'''
+        self._read_headers()
+        set_zero(self.trace_hdrs, self.stream, traces, mask)
 
@@ -26,16 +26,169 @@ _____________________________________________________________________________
 See Readme for detailed information
 
 """
-
-from header import *
+import os
+from Formats.header import *
 import numpy as np
 from struct import pack, unpack
+from Formats.tools import *
+
+# raw sample dtypes of SEG-Y data sample format codes, big-endian
+SEGY_data_dtypes = {1: np.dtype('>u4'), 2: np.dtype('>i4'), 
+                    3: np.dtype('>i2'), 5: np.dtype('>f4'),
+                    8: np.dtype('i1')}
+
+def ibm2ieee(data):
+    'returns float32 array of IBM 370 floats given as 32 bit integer array'
+
+    # INFO:
+    # An IBM 370 single precision float is 1 sign bit, a 7 bit base 16 
+    # exponent biased by 64 and a 24 bit fraction.
+    # value = (-1)**sign * fraction / 2**24 * 16**(exponent - 64)
+    # Values beyond the IEEE float32 range become +-inf or 0.
+    #
+    # Input : integer array of any shape (i.e. '>u4' samples)
+    # Output : numpy float32 array of the same shape
+    #
+    # added: 18/10/26
+
+    data = np.asarray(data).astype('u4')
+    fraction = (data & 0x00ffffff).astype('float64')
+    exponent = ((data >> 24) & 0x7f).astype('int32')*4 - 280
+    fraction[(data >> 31).astype(bool)] *= -1
+    return np.ldexp(fraction, exponent).astype('float32')
+
+class SEGY:
+    '''Class to parse SEG-Y rev 0/1 data. Trace headers and data are mapped
+    from file (copy on write), IBM floats are decoded to IEEE 32 bit floats.
+    lazy = True decodes traces on first access of .stream. byteorder is 
+    detected from the data sample format code if not given'''
+
+    # INFO:
+    # The 3200 byte textual header (EBCDIC or ascii) is kept as .text, the
+    # values of the binary header (SEGY_binary_file_header_format) are 
+    # assigned as variables and kept in .binary_header. Extended textual 
+    # headers are skipped. Traces are fixed length, ns samples of 
+    # data_sample_format_code 1 (IBM float), 2 (int32), 3 (int16), 
+    # 5 (IEEE float) or 8 (int8). Integer and IEEE samples are kept in their
+    # sample type, IBM floats are decoded as a whole on .read(), or per 
+    # trace (lazy) and per batch (.iter_traces) into float32. Little-endian
+    # files (i.e. 'sgy' written by write_binary) are mapped with swapped 
+    # dtypes, values are swapped when accessed.
+    #
+    # Input : INFILE, opt. lazy = False, cache_bytes of decoded lazy traces,
+    #         byteorder = '>' (standard) or '<', detected if None
+    #
+    # added: 18/10/26
+
+    def __init__(self, binary_file, lazy=False, cache_bytes=64*2**20,
+                 byteorder=None):
+        self.binary_file = binary_file
+        self.byteorder = byteorder
+        self.fileformat = 'su'
+        self.tracl = 0
+        self.trace_hdrs = HeaderTable()
+        self.stream = []
+        self.if_read = False
+        self.traces = 0
+        # assign zero headers for SU trace headers
+        for field in SU_trace_header_format:
+            setattr(self,field[2], 0)
+        with open(binary_file,'rb') as f:
+            self.bin = f.read(3600)
+        self._read_file_header()
+        self.read(lazy, cache_bytes)
+
+    def _read_file_header(self):
+        'parses textual and binary file header, sets trace dtype and count'
+        self.text = self.bin[0:3200]
+        # ascii textual headers start with 'C', EBCDIC with 0xC3
+        if self.text[0:1] != 'C':
+            self.text = self.text.decode('cp500').encode('ascii', 'replace')
+        if self.byteorder is None:
+            self.byteorder = detect_byteorder(self.bin, 3224, 'H',
+                                lambda code: code in SEGY_data_dtypes)
+            if self.byteorder is None:
+                self.byteorder = '>'
+        self.binary_header = compile_header(SEGY_binary_file_header_format,
+                                            self.byteorder).unpack(self.bin)
+        for name, val in self.binary_header.items():
+            setattr(self, name, val)
+        code = self.data_sample_format_code
+        if code not in SEGY_data_dtypes:
+            raise ValueError('unsupported SEG-Y data sample format code %i' 
+                             % code)
+        self._offset = 3600
+        if self.seg_y_format_revision_number > 0:
+            self._offset += 3200*self.nr_of_hdr_records_2follow
+        self.ns = self.binary_header['ns']
+        if self.ns == 0:
+            # samples per trace of the first trace header
+            with open(self.binary_file, 'rb') as f:
+                f.seek(self._offset + 114)
+                self.ns = unpack(self.byteorder + 'H', f.read(2))[0]
+        self._dtype = trace_dtype(self.ns, data_format=SEGY_data_dtypes[
+                                  code].newbyteorder(self.byteorder),
+                                  byteorder=self.byteorder)
+        self.traces = max(0, (os.stat(self.binary_file).st_size 
+                              - self._offset)) // self._dtype.itemsize
+
+    def _decode(self, data):
+        'returns trace data of raw samples, IBM floats decoded to float32'
+        if self.data_sample_format_code == 1:
+            return ibm2ieee(data)
+        return data
+
+    def _decode_trace(self, n):
+        'returns decoded trace n'
+        return self._decode(self._records['data'][n])
+
+    def read(self, lazy=False, cache_bytes=64*2**20):
+        'maps header info and trace data as record array views of the file'
+        # copy-on-write, header and data changes never reach the file
+        if self.traces > 0:
+            self._records = np.memmap(self.binary_file, mode='c', 
+                                      dtype=self._dtype, offset=self._offset,
+                                      shape=(self.traces,))
+        else:
+            self._records = np.zeros(0, dtype=self._dtype)
+        self.trace_hdrs = HeaderTable.from_records(self._records)
+        if lazy and self.data_sample_format_code == 1:
+            self.stream = LazyStream(self.traces, self._decode_trace,
+                                     cache_bytes)
+        else:
+            self.stream = self._decode(self._records['data'])
+        self.if_read = True
+        if self.traces > 0:
+            # header values of the last trace
+            for name, val in self.trace_hdrs.row(self.traces - 1).items():
+                setattr(self, name, val)
+
+    def iter_traces(self, batch=1000):
+        'yields (header table, trace data) of up to batch traces at a time'
+        for start in range(0, self.traces, batch):
+            records = self._records[start:start + batch]
+            trace_hdrs = self.trace_hdrs[start:start + batch]
+            if isinstance(self.stream, LazyStream):
+                yield trace_hdrs, self._decode(records['data'])
+            else:
+                yield trace_hdrs, self.stream[start:start + batch]
+
+    def write(self, outfile):
+        'writes to file, format : su, seg2 or sgy; IEEE 32 bit floats'
+        write_binary(self.trace_hdrs, self.stream, self.fileformat, outfile)
+
+    def header(self, field):
+        'returns value for header field'
+        return get_header(self.trace_hdrs, field)
+
+    def setheader(self, field, values, traces=None):
+        '''changes header field(s). Set field name and value(s). Array of 
+        values must = number of traces. Integer value is applied to all
+        traces. An array of two values is interpreted as ['tracl','value']. 
+        opt. traces = list of tracl values the value(s) are applied to''' 
+        set_header(self.trace_hdrs, field, values, traces)
 
-SEGY_mandatory = {'trid':1, 
-                  'data_sample_format_code':5,
-                  'trace_sorting_code':1,
-                  'measurement_system':1,
-                  'fixed_length_trace_flag':1,
-                  'seg_y_format_revision_number':0,
-                  'nr_of_hdr_records_2follow':0,
-                  'nr_tr_in_ensemble':1}
+    def zero(self, traces, mask=False):
+        '''zeros specified trace data. mask = True marks the traces dead and
+        zeros them when written, trace data is not changed'''
+        set_zero(self.trace_hdrs, self.stream, traces, mask)
@@ -65,14 +65,18 @@ class SICK510:
     #           opt: delim = : file format deliminator [Default =',']
     #
     # Function calls:
-    #       .read()
+    #       .read(chunk_bytes = 64*2**20)
     #           will parse the ascii_file, parsing N elements using the
-    #           file seperator = delim. 
+    #           file seperator = delim, chunk_bytes of the file at a time.
     #           .header (header) = file lines[0:hdrlim]
     #           .stream (data) = file lines[hdrlim:data]
     #
+    #       .iter_swaths(batch = None, chunk_bytes = 64*2**20)
+    #           yields (header, data) arrays of up to batch swaths at a time
+    #           for files too large to be held in memory
+    #
     #       .get_xyz(offset = 0, rotation = 0, scale = 1, 
-    #                                                  cmin = -5, cmax = 185)
+    #                           cmin = -5, cmax = 185, dtype = 'float64')
     #           will convert the data values to corresponding cartesian xyz 
     #           coordinates based on the polar coordinate system set up by 
     #           the Lidar position and input variables.
@@ -87,9 +91,15 @@ class SICK510:
     #                      swath [DEFAULT = -5]
     #               cmax = is the maximum angle extent (degrees) of the lidar 
     #                      swath [DEFAULT = 185]
+    #               dtype = of the returned array [DEFAULT = 'float64']
     #           Output :
-    #               array of [x,y,z, length] values for each line of the 
-    #               .stream data array
+    #               (points, 4) array of [x,y,z, length] values for each 
+    #               sample of the .stream data array, swath by swath. The
+    #               inclination of the rotation axis is applied to x and z
+    #
+    #       .iter_xyz(batch = 1000, chunk_bytes = 64*2**20, **get_xyz opts)
+    #           yields xyz arrays of up to batch swaths at a time from the 
+    #           ascii_file, i.e. for Formats.cloud.write_cloud
     #
     # added: 11/3/16 by Ralf Hansen
 
@@ -108,24 +118,91 @@ class SICK510:
         for field in SICK_trace_header_format:
             setattr(self,field[1], 0)
 
-    def read(self):
-        start = False
-        with open(self.file) as f:
-            # Read file line by line
-            for newline in f.readlines():
-                # assign to object stream 
-                line = np.array(newline.strip("\r\n").split(self.delim))
-                # assign reference hdr & exclude multiples of angle increment
-                if start and not ref_hdr == line[0] and float(line[0]) >9000:
-                    self.header += [line[0:self._hdrlim]]
-                    self.stream += [line[self._hdrlim:len(line)-1]]
-                ref_hdr = line[0]
-                start = True
-        self.header = np.array(self.header, dtype='float32')
-        self.stream = np.array(self.stream, dtype='float32')
+    def read(self, chunk_bytes = 64*2**20):
+        'parses the ascii file into .header and .stream float32 arrays'
+        header = [np.zeros((0, self._hdrlim), dtype='float32')]
+        stream = []
+        for swath_header, swath_stream in self.iter_swaths(
+                                                chunk_bytes = chunk_bytes):
+            header += [swath_header]
+            stream += [swath_stream]
+        self.header = np.concatenate(header)
+        if len(stream) > 0:
+            self.stream = np.concatenate(stream)
+        else:
+            self.stream = np.zeros((0, 0), dtype='float32')
+
+    def iter_swaths(self, batch = None, chunk_bytes = 64*2**20):
+        '''yields (header, stream) float32 arrays of the swaths of the ascii 
+        file, of up to batch swaths at a time if given. The file is read
+        chunk_bytes at a time'''
+        with open(self.file, 'rb') as f:
+            # first line is skipped, its angle is the first reference
+            ref_hdr = self._first_value(f.readline())
+            fields = None
+            rest = ''
+            while True:
+                chunk = f.read(chunk_bytes)
+                # parse whole lines only, carry the last partial line
+                text = rest + chunk
+                if len(chunk) > 0:
+                    end = text.rfind('\n') + 1
+                    text, rest = text[0:end], text[end::]
+                if text.strip() != '':
+                    if fields is None:
+                        fields = self._fields(text)
+                    values = self._parse_block(text, fields)
+                    # exclude repeated angles & multiples of angle increment
+                    angle = values[:, 0]
+                    previous = np.empty_like(angle)
+                    previous[0] = ref_hdr
+                    previous[1::] = angle[0:-1]
+                    keep = (angle != previous) & (angle > 9000)
+                    ref_hdr = angle[-1]
+                    swaths = values[keep].astype('float32')
+                    if batch is None:
+                        batch_size = max(len(swaths), 1)
+                    else:
+                        batch_size = batch
+                    for start in range(0, len(swaths), batch_size):
+                        block = swaths[start:start + batch_size]
+                        # last field of a line is not a sample
+                        yield (block[:, 0:self._hdrlim], 
+                               block[:, self._hdrlim:fields[0] - 1])
+                if len(chunk) == 0:
+                    break
+
+    def _first_value(self, line):
+        'returns first field of a line as float, nan if not a number'
+        try:
+            return float(line.split(self.delim)[0])
+        except ValueError:
+            return np.nan
+
+    def _fields(self, text):
+        '''returns number of fields per line and if lines end with a 
+        delimiter'''
+        line = text[0:text.find('\n')].rstrip('\r')
+        return len(line.split(self.delim)), line.endswith(self.delim)
+
+    def _parse_block(self, text, fields):
+        'returns float64 array (lines, values) of a block of whole lines'
+        count, trailing = fields
+        text = text.replace('\r', '').strip('\n')
+        lines = text.count('\n') + 1
+        if trailing:
+            # drop the empty last field
+            count -= 1
+            text = text.replace(self.delim + '\n', '\n')[0:-len(self.delim)]
+        values = np.fromstring(text.replace('\n', self.delim), 
+                               dtype='float64', sep=self.delim)
+        if len(values) != lines*count:
+            raise ValueError('lines of %s are not %i numeric fields' % 
+                             (self.file, count))
+        return values.reshape(lines, count)
 
     def get_xyz(self, offset = 0., rotation = 0., scale = 1, flip = False,
-                cmin = -5, cmax = 185):
+                cmin = -5, cmax = 185, dtype = 'float64'):
         '''
         determines cartesion coordinates.
             opt. :  offset is distance from center of rotation to center of 
@@ -137,47 +214,59 @@ class SICK510:
                     becomes right to left to agree with coordinate system
             opt. :  cmin is the min angle extent (degrees) of the lidar swath
             opt. :  cmax is the max angle extent (degrees) of the lidar swath
+            opt. :  dtype of the returned (points, 4) array
         '''
+        return self._xyz(self.header, self.stream, offset, rotation, scale,
+                         flip, cmin, cmax, dtype)
 
-        xyz = []
+    def iter_xyz(self, batch = 1000, chunk_bytes = 64*2**20, offset = 0., 
+                 rotation = 0., scale = 1, flip = False, cmin = -5, 
+                 cmax = 185, dtype = 'float32'):
+        '''yields (points, 4) arrays of the cartesian coordinates of up to
+        batch swaths at a time, parsed from the ascii file. See .get_xyz'''
+        for header, stream in self.iter_swaths(batch, chunk_bytes):
+            yield self._xyz(header, stream, offset, rotation, scale, flip,
+                            cmin, cmax, dtype)
+
+    def _xyz(self, header, stream, offset, rotation, scale, flip, cmin, 
+             cmax, dtype):
+        'returns (points, 4) array of the cartesian coordinates of swaths'
+        stream = np.asarray(stream, dtype='float64')
+        swaths, samples = stream.shape
+        if swaths*samples == 0:
+            return np.zeros((0, 4), dtype=dtype)
 
         # gamma is the rotational axis inclination angle from horizontal
         # assume a rotated coordinate system
-        gamma = float(self.inclination)
-
-        for swath in range(len(self.stream)):
-            # define lidar angular sample increment
-            inc = (cmax - cmin) / float(len(self.stream[swath]))
-            # beta is the axis rotational angle
-            beta = float(self.header[swath, 0]) + rotation
-            # determine xyz position for each sample in swath
-            for sample in range(len(self.stream[swath])):
-                # alpha is the angle of the laser ping on xy-swath plane
-                # starts at cmin to cmax
-                alpha = float(cmin + sample*inc)
-
-                # mirror angle based on data flip setting
-                if flip:
-                    alpha = (alpha - cmax) *-1.
-
-                # determine alpha quadrant
-                z, projyzswath = polar2cartesian(
-                            alpha, float(self.stream[swath, sample])*scale
-                                            )
-                # determine beta quadrant
-                x, y = polar2cartesian(beta, projyzswath)
-
-                # test for offset and add
-                if offset > 0:
-                    # determine offset correction
-                    xadd, yadd = polar2cartesian(beta, offset)
-                    y = y + yadd
-                    x = x + xadd
-                    
-                # project into gamma quadrant
-                #x = xswath #*np.cos(radians(gamma)) 
-                #z = zswath #*np.cos(radians(gamma))
-
-                xyz += [[x, y, z, self.stream[swath, sample]]]
+        gamma = radians(float(self.inclination))
+
+        # alpha is the angle of the laser ping on xy-swath plane, starts at
+        # cmin to cmax by the lidar angular sample increment
+        alpha = cmin + np.arange(samples)*((cmax - cmin) / float(samples))
+        # mirror angle based on data flip setting
+        if flip:
+            alpha = (alpha - cmax) *-1.
+        # beta is the axis rotational angle of each swath
+        beta = np.asarray(header, dtype='float64')[:, 0:1] + rotation
+
+        # determine alpha quadrant
+        z, projyzswath = polar2cartesian(alpha, stream*scale)
+        # determine beta quadrant
+        x, y = polar2cartesian(beta, projyzswath)
+
+        # test for offset and add
+        if offset > 0:
+            # determine offset correction
+            xadd, yadd = polar2cartesian(beta, offset)
+            x += xadd
+            y += yadd
+
+        # project from the inclined rotation axis system back onto x and z
+        if gamma != 0:
+            x, z = (x*np.cos(gamma) - z*np.sin(gamma), 
+                    x*np.sin(gamma) + z*np.cos(gamma))
 
+        xyz = np.empty((swaths*samples, 4), dtype=dtype)
+        for column, values in enumerate([x, y, z, stream]):
+            xyz[:, column] = values.ravel()
         return xyz
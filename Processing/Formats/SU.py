@@ -26,6 +26,7 @@ _____________________________________________________________________________
 See Readme for detailed information
 
 """
+import os
 from Formats.header import *
 import numpy as np
 from struct import pack, unpack
@@ -33,70 +34,99 @@ from Toolbox.utils import bit, read_bit_range
 from Formats.tools import *
 
 class SU:
-    def __init__(self, binary_file):
+    '''Class to parse binary SU format data. Use memmap = True to map the
+    file as zero-copy header and trace data views instead of reading it,
+    lazy = True to only read traces through .iter_traces(). byteorder '<' 
+    or '>' of the file is detected from ns of the first trace if not given,
+    values are swapped when accessed'''
+    def __init__(self, binary_file, memmap=False, lazy=False, 
+                 byteorder=None):
+        self.binary_file = binary_file
+        self.byteorder = byteorder
         self.fileformat = 'su'
         self.tracl = 0
-        self.trace_hdrs = []
+        self.trace_hdrs = HeaderTable()
         self.hdr = None
         self.stream = []
         self.if_read = False
         self.traces = 1
         self.spacing = 0
-        # open file
-        f = open(binary_file,'rb') 
-        self.bin = f.read()
-        f.close()
         # assign zero headers for SU trace headers
         for field in SU_trace_header_format:
             setattr(self,field[2], 0)
-        # read data
-        self.read()
+        if memmap:
+            self.read_memmap()
+        elif lazy:
+            self._read_size()
+        else:
+            # open file
+            f = open(binary_file,'rb') 
+            self.bin = f.read()
+            f.close()
+            # read data
+            self.read()
+
+    def _read_size(self, binary=None):
+        'reads samples per trace from the first header and number of traces'
+        if binary is None:
+            with open(self.binary_file, 'rb') as f:
+                binary = f.read(240)
+            filesize = os.stat(self.binary_file).st_size
+        else:
+            filesize = len(binary)
+        if self.byteorder is None:
+            # ns of the byte order that divides the file into whole traces
+            self.byteorder = detect_byteorder(binary, 114, 'H', 
+                lambda ns: ns > 0 and filesize % (4 * ns + 240) == 0)
+            if self.byteorder is None:
+                self.byteorder = '='
+        self.ns = unpack(self.byteorder + 'H', binary[114:116])[0]
+        band = 4 * self.ns + 240
+        self.traces = filesize / band
+
+    def _trace_dtype(self):
+        'returns trace record dtype of the file byte order'
+        return trace_dtype(self.ns, data_format=self.byteorder + 'f4',
+                           byteorder=self.byteorder)
+
+    def read_memmap(self):
+        'maps header info and trace data as record array views of the file'
+        self._read_size()
+        # copy-on-write, header and data changes never reach the file
+        self._set_records(np.memmap(self.binary_file, mode='c',
+                          dtype=self._trace_dtype(), shape=(self.traces,)))
 
     def read(self):
         'parse header info and trace data into header and stream objects'
-        trace_count = 0
-        band = 0
-        while trace_count < self.traces:
-            trace_hdr = []
-
-            # read trace headers'
-            for field in SU_trace_header_format:
-
-                # define variables based on input headerfield
-                length, start, name, bin_format = field
-                start += (band * trace_count)
-                if length == 8:
-                    setattr(self, name, unpack('q',
-                            self.bin[start:(start+length)])[0])
-                else:
-                    setattr(self, name, unpack('%s' % bin_format,
-                            self.bin[start:(start+length)])[0])
-
-            if self.traces == 1:
-                band = 4 *self.ns + 240
-                self.traces = len(self.bin)/band
-                self.spacing = self.gx
-
-            # read data block
-            data = []
-            for n in range(self.ns):
-                data_start = band * trace_count + 240 + n*4
-                data += unpack('f', self.bin[data_start:data_start+4])
-            data = np.array(data, dtype='float32')
-            self.stream += [data]
-
-            # increment trace_count
-            trace_count+=1
-            if trace_count == 2:
-                self.spacing  = self.gx - self.spacing
-
-            # setting header list
-            trace_hdr = []
-            for field in SU_trace_header_format:
-                length, start, name, bin_format = field
-                val = eval('self.' + name)
-                trace_hdr += [name, val]
-            self.trace_hdrs += [trace_hdr]
+        self._read_size(self.bin)
+        # decode all trace headers and samples at once
+        self._set_records(np.frombuffer(self.bin, dtype=self._trace_dtype(),
+                                        count=self.traces).copy())
+
+    def _set_records(self, records):
+        'assigns header table and stream of a trace record array'
+        self.trace_hdrs = HeaderTable.from_records(records)
+        self.stream = records['data']
+        self.if_read = True
+        if self.traces > 0:
+            # header values of the last trace
+            for name, val in self.trace_hdrs.row(self.traces - 1).items():
+                setattr(self, name, val)
+            self.spacing = self.trace_hdrs['gx'][0]
+        if self.traces > 1:
+            self.spacing = (self.trace_hdrs['gx'][1] 
+                            - self.trace_hdrs['gx'][0])
+
+    def iter_traces(self, batch=1000):
+        '''yields (header table, trace data) of up to batch traces at a time,
+        unread files are read from disk one batch at a time'''
+        if self.if_read:
+            for traces in iter_batches(self.trace_hdrs, self.stream, batch):
+                yield traces
+        else:
+            for records in iter_records(self.binary_file, 
+                                        self._trace_dtype(), batch):
+                yield HeaderTable.from_records(records), records['data']
 
     # test for defined format string
     if 'args.fileformat' in globals():
@@ -104,19 +134,25 @@ class SU:
 
     def write(self,outfile):
         'writes to file, format : su, seg2 or sgy; IEEE 32 bit floats'
+        if not self.if_read:
+            # lazy file, traces are streamed from disk one batch at a time
+            from Formats.convert import convert_stream
+            convert_stream(self, outfile, self.fileformat)
+            return
         write_binary(self.trace_hdrs, self.stream, self.fileformat, outfile)
 
     def header(self, field):
         'returns value for header field'
         return get_header(self.trace_hdrs, field)
 
-    def setheader(self, field, values):
+    def setheader(self, field, values, traces=None):
         '''changes header field(s). Set field name and value(s). Array of 
         values must = number of traces. Integer value is applied to all
-        traces. An array of two values is interpreted as ['tracl','value']''' 
-        set_header(self.trace_hdrs, field, values)
-
-    def zero(self, traces):
-        'zeros specified trace data.'
-        set_zero(self.trace_hdrs, self.stream, traces)
-
+        traces. An array of two values is interpreted as ['tracl','value']. 
+        opt. traces = list of tracl values the value(s) are applied to''' 
+        set_header(self.trace_hdrs, field, values, traces)
+
+    def zero(self, traces, mask=False):
+        '''zeros specified trace data. mask = True marks the traces dead and
+        zeros them when written, trace data is not changed'''
+        set_zero(self.trace_hdrs, self.stream, traces, mask)
@@ -0,0 +1,244 @@
+#!/usr/bin/python
+"""
+Copyright (c) 2016 by Ralf Hansen @ Frontier Geosciences Inc.
+North Vancouver, B.C., Canada.
+All Rights Reserved
+
+This program is free software. You can redistribute it and/or modify this
+software and its documentation for any purpose and without fee, provided that
+the above copyright notice appear in all copies and that both that copyright
+notice and this permission notice appear in supporting documentation, and 
+that the name of the original authors not be used in advertising or publicity
+pertaining to distribution of the software without specific, written prior
+permission.
+_____________________________________________________________________________
+
+DISCLAIMER : This program is distributed in the hope that it will be useful,
+             but WITHOUT ANY WARRANTY; without even the implied warranty of
+             MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. IN NO EVENT
+             SHALL AUTHOR OR ASSOCIATES BE LIABLE FOR ANY SPECIAL, INDIRECT
+             OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING
+             FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF
+             CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF 
+             OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+_____________________________________________________________________________
+
+See Readme for detailed information
+
+"""
+import os
+import shutil
+import hashlib
+import tempfile
+import cPickle as pickle
+import numpy as np
+from Toolbox.utils import sniff, sniff_options, reader
+from Formats.tools import HeaderTable
+
+# cache directory and disk budget in bytes, least recently used files are
+# dropped first once the budget is exceeded
+cache_dir = os.environ.get('GEOSCIENCE_CACHE', os.path.join(
+                           os.path.expanduser('~'), '.cache', 'geoscience'))
+cache_bytes = 4*2**30
+
+# strings longer than this (raw file contents) are not cached
+_max_string = 4096
+
+class _Cached:
+    'instance restored from the cache, its class is set to the reader class'
+    pass
+
+def _key(infile, cls, options):
+    'returns cache key of a file, its size and mtime, reader and options'
+    stat = os.stat(infile)
+    key = repr((os.path.abspath(infile), stat.st_size, stat.st_mtime,
+                cls.__module__ + '.' + cls.__name__, sorted(options.items())))
+    return hashlib.sha1(key).hexdigest()
+
+def _table_records(table):
+    'returns record array of the columns of a header table'
+    records = np.zeros(len(table), dtype=[(name, table[name].dtype) for 
+                                          name in table.fields])
+    for name in table.fields:
+        records[name] = table[name]
+    return records
+
+def _store(data, path, infile, cls, options):
+    'writes arrays and values of a reader object to cache entry path'
+    # arrays are saved as .npy files, header tables as record arrays and 
+    # lists of equal length arrays as one array, other values are pickled
+    arrays = {}
+    values = {}
+    for name, value in data.__dict__.items():
+        if isinstance(value, HeaderTable):
+            arrays[name] = ('table', _table_records(value))
+            if value.mask is not None:
+                arrays[name + '.mask'] = ('mask', value.mask)
+        elif isinstance(value, np.ndarray) and value.dtype != object:
+            arrays[name] = ('array', value)
+        elif (isinstance(value, list) and len(value) > 0 and 
+              all(isinstance(item, np.ndarray) for item in value)):
+            if len(set([item.shape for item in value])) > 1:
+                raise ValueError('%s of differing shapes is not cached' % 
+                                 name)
+            arrays[name] = ('list', np.array(value))
+        elif isinstance(value, str) and len(value) > _max_string:
+            continue
+        else:
+            try:
+                values[name] = pickle.dumps(value, 2)
+            except Exception:
+                # open files, maps and compiled codecs
+                continue
+    entry = tempfile.mkdtemp(prefix='.tmp', dir=cache_dir)
+    try:
+        kinds = {}
+        for name, (kind, array) in arrays.items():
+            np.save(os.path.join(entry, name + '.npy'), array)
+            kinds[name] = (kind, array.size > 0)
+        with open(os.path.join(entry, 'entry.pkl'), 'wb') as f:
+            pickle.dump({'infile': os.path.abspath(infile), 
+                         'reader': cls.__module__ + '.' + cls.__name__,
+                         'options': options, 'arrays': kinds,
+                         'values': values}, f, 2)
+        os.rename(entry, path)
+    except OSError:
+        # entry written by another process in the meantime
+        if not os.path.isdir(path):
+            raise
+    finally:
+        if os.path.isdir(entry):
+            shutil.rmtree(entry)
+
+def _load(path, cls):
+    'returns reader object of cache entry path, arrays mapped copy on write'
+    with open(os.path.join(path, 'entry.pkl'), 'rb') as f:
+        entry = pickle.load(f)
+    data = _Cached()
+    data.__class__ = cls
+    for name, value in entry['values'].items():
+        setattr(data, name, pickle.loads(value))
+    masks = {}
+    for name, (kind, size) in entry['arrays'].items():
+        mmap_mode = None
+        if size:
+            mmap_mode = 'c'
+        array = np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode)
+        if kind == 'table':
+            table = HeaderTable(columns=dict((field, array[field]) for field 
+                                             in array.dtype.names))
+            table.fields = list(array.dtype.names)
+            setattr(data, name, table)
+        elif kind == 'mask':
+            masks[name[:-5]] = np.array(array)
+        elif kind == 'list':
+            setattr(data, name, list(array))
+        else:
+            setattr(data, name, array)
+    for name, mask in masks.items():
+        getattr(data, name).mask = mask
+    return data
+
+def open_cached(infile, cls=None, **options):
+    '''returns reader object of INFILE, from the cache if the file is 
+    unchanged, else read by cls(INFILE, **options) and cached'''
+
+    # INFO:
+    # This function keeps decoded files in cache_dir, one entry per file
+    # size, mtime, reader class and options. Header tables and trace data
+    # are stored as .npy files and reopened memory mapped (copy on write),
+    # other values of the reader object are pickled. The reader class and
+    # byte order are detected with Toolbox.utils.sniff and sniff_options if
+    # cls is not given, readers that do not read on creation (i.e. 
+    # Formats.SICK.SICK510) are read. Lazy readers
+    # and data of traces of differing length are not cached. The raw file
+    # contents are not kept, restored objects are read already. Entries of
+    # a changed file are dropped on the next call, other entries least
+    # recently used first to keep the cache within cache_bytes.
+    #
+    # >> y = open_cached('line1.852')
+    #
+    # Input : INFILE, opt. reader class, reader options (i.e. inclination)
+    #
+    # Output : reader object, the same interface as cls(INFILE, **options)
+    #
+    # added: 18/10/26
+
+    if cls is None:
+        fileformat = sniff(infile)[0]
+        cls = reader(fileformat)
+        options = dict(sniff_options(infile, fileformat), **options)
+    path = os.path.join(cache_dir, _key(infile, cls, options))
+    if os.path.isdir(path):
+        # last use of an entry is its directory mtime
+        os.utime(path, None)
+        return _load(path, cls)
+    data = cls(infile, **options)
+    if getattr(data, 'if_read', None) is None and hasattr(data, 'read'):
+        data.read()
+    if options.get('lazy') or options.get('memmap'):
+        return data
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    for entry in cache_info():
+        if (entry['infile'] == os.path.abspath(infile) and entry['reader'] ==
+            cls.__module__ + '.' + cls.__name__ and 
+            entry['options'] == options):
+            shutil.rmtree(entry['path'], ignore_errors=True)
+    try:
+        _store(data, path, infile, cls, options)
+    except ValueError:
+        return data
+    evict_cache()
+    return data
+
+def _entries():
+    'returns list of (last use, bytes, path) of the cache entries'
+    entries = []
+    if not os.path.isdir(cache_dir):
+        return entries
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.startswith('.') or not os.path.isdir(path):
+            continue
+        size = sum([os.path.getsize(os.path.join(path, item)) for item in 
+                    os.listdir(path)])
+        entries += [(os.path.getmtime(path), size, path)]
+    return sorted(entries)
+
+def cache_info():
+    'returns list of dictionaries of the cache entries, most recent last'
+    info = []
+    for used, size, path in _entries():
+        with open(os.path.join(path, 'entry.pkl'), 'rb') as f:
+            entry = pickle.load(f)
+        info += [{'infile': entry['infile'], 'reader': entry['reader'],
+                  'options': entry['options'], 'bytes': size, 
+                  'last_used': used, 'path': path}]
+    return info
+
+def evict_cache(budget=None):
+    '''drops least recently used entries until the cache is within budget
+    bytes (default cache_bytes), returns number of entries dropped'''
+    if budget is None:
+        budget = cache_bytes
+    entries = _entries()
+    total = sum([size for used, size, path in entries])
+    dropped = 0
+    for used, size, path in entries:
+        if total <= budget:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        dropped += 1
+    return dropped
+
+def purge_cache(infile=None):
+    '''drops all cache entries, or the entries of infile, returns number of
+    entries dropped'''
+    dropped = 0
+    for entry in cache_info():
+        if infile is None or entry['infile'] == os.path.abspath(infile):
+            shutil.rmtree(entry['path'], ignore_errors=True)
+            dropped += 1
+    return dropped
@@ -0,0 +1,125 @@
+#!/usr/bin/python
+"""
+Copyright (c) 2016 by Ralf Hansen @ Frontier Geosciences Inc.
+North Vancouver, B.C., Canada.
+All Rights Reserved
+
+This program is free software. You can redistribute it and/or modify this
+software and its documentation for any purpose and without fee, provided that
+the above copyright notice appear in all copies and that both that copyright
+notice and this permission notice appear in supporting documentation, and 
+that the name of the original authors not be used in advertising or publicity
+pertaining to distribution of the software without specific, written prior
+permission.
+_____________________________________________________________________________
+
+DISCLAIMER : This program is distributed in the hope that it will be useful,
+             but WITHOUT ANY WARRANTY; without even the implied warranty of
+             MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. IN NO EVENT
+             SHALL AUTHOR OR ASSOCIATES BE LIABLE FOR ANY SPECIAL, INDIRECT
+             OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING
+             FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF
+             CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF 
+             OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+_____________________________________________________________________________
+
+See Readme for detailed information
+
+"""
+import numpy as np
+from struct import pack
+
+# PLY property types of sample dtypes
+ply_property_types = {'f4': 'float', 'f8': 'double'}
+
+class PointCloud:
+    '''Binary point cloud writer, points are appended in batches and the 
+    header is completed on .close(). Format by file extension .ply or .npy'''
+
+    # INFO:
+    # This class writes point clouds of any size to a PLY file 
+    # (binary_little_endian) or a numpy .npy file. A header with room for
+    # the point count is written on creation, each .append() writes one
+    # batch of points straight to disk and .close() patches the final
+    # point count into the header. Only one batch is held in memory.
+    #
+    # >> with PointCloud('scan.ply') as cloud:
+    # >>     for xyz in lidar.iter_xyz():
+    # >>         cloud.append(xyz)
+    #
+    # Input : OUTFILE, opt. fields = ['x','y','z','length'] column names,
+    #         dtype = 'float32' [DEFAULT] or 'float64'
+    #
+    # added: 18/10/26
+
+    def __init__(self, outfile, fields = ['x', 'y', 'z', 'length'], 
+                 dtype = 'float32'):
+        self.outfile = outfile
+        self.fields = list(fields)
+        self.dtype = np.dtype(dtype).newbyteorder('<')
+        self.points = 0
+        if outfile.lower().endswith('.ply'):
+            self.fileformat = 'ply'
+        elif outfile.lower().endswith('.npy'):
+            self.fileformat = 'npy'
+        else:
+            raise ValueError('point cloud format of %s not supported, '
+                             'use .ply or .npy' % outfile)
+        self._file = open(outfile, 'wb')
+        self._file.write(self._header())
+        self._header_size = self._file.tell()
+
+    def _header(self):
+        'returns file header of the current point count'
+        if self.fileformat == 'ply':
+            # fixed width count, zero padded to keep the token a number
+            header = ('ply\nformat binary_little_endian 1.0\n'
+                      'element vertex %020i\n' % self.points)
+            for name in self.fields:
+                header += 'property %s %s\n' % (
+                          ply_property_types[self.dtype.str[1::]], name)
+            return header + 'end_header\n'
+        # npy version 1.0 header, padded to a fixed 128 bytes
+        header = ("{'descr': '%s', 'fortran_order': False, 'shape': (%i, %i), }"
+                  % (self.dtype.str, self.points, len(self.fields)))
+        header = header.ljust(128 - 11) + '\n'
+        return '\x93NUMPY\x01\x00' + pack('<H', len(header)) + header
+
+    def append(self, points):
+        'writes an array of points (points, fields) to file'
+        points = np.ascontiguousarray(points, dtype=self.dtype)
+        if points.ndim != 2 or points.shape[1] != len(self.fields):
+            raise ValueError('points must be an array (points, %i)' % 
+                             len(self.fields))
+        points.tofile(self._file)
+        self.points += len(points)
+
+    def write(self, batches):
+        'appends all point arrays of an iterable, i.e. a generator'
+        for points in batches:
+            self.append(points)
+
+    def close(self):
+        'writes the point count into the header and closes the file'
+        if self._file.closed:
+            return
+        header = self._header()
+        if len(header) != self._header_size:
+            raise ValueError('point count %i exceeds header' % self.points)
+        self._file.seek(0)
+        self._file.write(header)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def write_cloud(outfile, batches, fields = ['x', 'y', 'z', 'length'],
+                dtype = 'float32'):
+    '''writes point arrays of batches (i.e. a generator) to a .ply or .npy 
+    point cloud file, returns number of points written'''
+    with PointCloud(outfile, fields, dtype) as cloud:
+        cloud.write(batches)
+    return cloud.points
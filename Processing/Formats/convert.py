@@ -0,0 +1,308 @@
+#!/usr/bin/python
+"""
+Copyright (c) 2016 by Ralf Hansen @ Frontier Geosciences Inc.
+North Vancouver, B.C., Canada.
+All Rights Reserved
+
+This program is free software. You can redistribute it and/or modify this
+software and its documentation for any purpose and without fee, provided that
+the above copyright notice appear in all copies and that both that copyright
+notice and this permission notice appear in supporting documentation, and 
+that the name of the original authors not be used in advertising or publicity
+pertaining to distribution of the software without specific, written prior
+permission.
+_____________________________________________________________________________
+
+DISCLAIMER : This program is distributed in the hope that it will be useful,
+             but WITHOUT ANY WARRANTY; without even the implied warranty of
+             MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. IN NO EVENT
+             SHALL AUTHOR OR ASSOCIATES BE LIABLE FOR ANY SPECIAL, INDIRECT
+             OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING
+             FROM LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF
+             CONTRACT, NEGLIGENCE OR OTHER TORTIOUS ACTION, ARISING OUT OF 
+             OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+_____________________________________________________________________________
+
+See Readme for detailed information
+
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from Queue import Queue, Full
+from multiprocessing import Pool
+from Toolbox.utils import sniff, sniff_options, sniff_files, reader
+from Formats.tools import current_version, SUWriter, SEGYWriter, SEG2Writer
+
+# reader options of input formats that read traces one batch at a time
+reader_options = {'su': {'lazy': True},
+                  'sgy': {'lazy': True},
+                  'sg2': {'lazy': True},
+                  'dzt': {'lazy': True},
+                  '81e': {'lazy': True},
+                  '851': {'lazy': True},
+                  '852': {'lazy': True}}
+
+# trace writers of output formats
+trace_writers = {'su': SUWriter, 'sgy': SEGYWriter, 'sg2': SEG2Writer}
+
+def _put(queue, item, stop):
+    'puts item on queue unless stopped while the queue is full'
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=0.1)
+            return True
+        except Full:
+            pass
+    return False
+
+def _read_batches(batches, queue, stop):
+    'puts batches on queue until done or stopped, then an end marker'
+    # every put gives up once the writer has stopped, so the thread always
+    # ends even if nothing takes from the queue any more
+    try:
+        for batch in batches:
+            if not _put(queue, batch, stop):
+                return
+        _put(queue, None, stop)
+    except Exception as error:
+        _put(queue, error, stop)
+
+def convert_stream(data, outfile, fileformat='su', batch=1000, 
+                   queue_size=4, byteorder='='):
+    '''writes the traces of reader object data to OUTFILE of fileformat, 
+    decoding and encoding in separate threads, returns number of traces'''
+
+    # INFO:
+    # This function connects data.iter_traces(batch) to a trace writer 
+    # (Formats.tools.SUWriter, SEGYWriter, SEG2Writer) through a queue of 
+    # at most queue_size batches. The reader thread decodes the next 
+    # batches while the calling thread encodes and writes, so at most 
+    # queue_size + 2 batches are in memory, whatever the file size. 
+    # Readers opened with lazy = True read their file one batch at a time.
+    # An error of the reader is raised in the calling thread.
+    #
+    # >> convert_stream(Formats.DZT.DZT(INFILE, lazy = True), 'line.su')
+    #
+    # Input : reader object, OUTFILE, fileformat = 'su' [DEFAULT], 'sgy' or 
+    #         'sg2', batch = 1000 traces, queue_size = 4 batches, 
+    #         byteorder = '=' [DEFAULT], '<' or '>' of OUTFILE
+    #
+    # Output : returns number of traces written
+    #
+    # added: 18/10/26
+
+    if fileformat == 'sg2':
+        # pointer table of the traces of the file, largest if unknown
+        writer = SEG2Writer(outfile, byteorder, 
+                            max(getattr(data, 'traces', 0) or 16383, 1056))
+    else:
+        writer = trace_writers[fileformat](outfile, byteorder)
+    queue = Queue(queue_size)
+    stop = threading.Event()
+    thread = threading.Thread(target=_read_batches, 
+                              args=(data.iter_traces(batch), queue, stop))
+    thread.daemon = True
+    thread.start()
+    try:
+        with writer:
+            while True:
+                item = queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                writer.append(*item)
+    finally:
+        stop.set()
+        thread.join()
+    return writer.traces
+
+def convert_file(infile, outfile, fileformat='su', informat=None):
+    '''converts INFILE to OUTFILE of fileformat 'su', 'sgy' or 'sg2',
+    returns a report dictionary of the conversion'''
+
+    # INFO:
+    # This function converts one file. The input format is detected with
+    # Toolbox.utils.sniff unless informat is given, the file is opened
+    # with its reader class in the mode that reads one batch of traces at a
+    # time (reader_options), in the byte order found by 
+    # Toolbox.utils.sniff_options, and streamed to OUTFILE by convert_stream.
+    # Errors are caught and returned in the report, so one bad file does 
+    # not stop a batch.
+    #
+    # Input : INFILE, OUTFILE, fileformat = 'su' [DEFAULT], 'sgy' or 'sg2',
+    #         opt. informat (i.e. 'dzt')
+    #
+    # Output : dictionary of infile, outfile, informat, bytes, traces, 
+    #          seconds, MB/s and error (None if converted)
+    #
+    # added: 18/10/26
+
+    report = {'infile': infile, 'outfile': outfile, 'informat': informat,
+              'bytes': 0, 'traces': 0, 'seconds': 0., 'MB/s': 0., 
+              'error': None}
+    start = time.time()
+    try:
+        report['bytes'] = os.stat(infile).st_size
+        if informat is None:
+            informat = report['informat'] = sniff(infile)[0]
+        if os.path.abspath(infile) == os.path.abspath(outfile):
+            raise ValueError('output file is the input file')
+        cls = reader(informat)
+        if not hasattr(cls, 'iter_traces'):
+            raise ValueError('no conversion of file format %s' % informat)
+        # byte order found by the sniffer, i.e. of big-endian DZT files
+        options = dict(reader_options.get(informat, {}))
+        options.update(sniff_options(infile, informat))
+        data = cls(infile, **options)
+        try:
+            report['traces'] = convert_stream(data, outfile, fileformat)
+        finally:
+            # file maps of lazy readers
+            if hasattr(data, 'close'):
+                data.close()
+    except Exception as error:
+        report['error'] = '%s: %s' % (error.__class__.__name__, error)
+    report['seconds'] = time.time() - start
+    if report['error'] is None and report['seconds'] > 0:
+        report['MB/s'] = report['bytes'] / 2.**20 / report['seconds']
+    return report
+
+def _convert_job(job):
+    'convert_file of a (infile, outfile, fileformat, informat) job'
+    return convert_file(*job)
+
+def _conversion_jobs(paths, outdir, fileformat, min_confidence):
+    '''returns sniffed files of paths, their convert_file jobs and reports
+    of the files of unknown format'''
+    files = []
+    jobs = []
+    unknown = []
+    outfiles = set()
+    for infile, (informat, confidence) in sniff_files(paths).items():
+        files += [infile]
+        # the input extension is kept if the output name is already taken
+        name = os.path.join(outdir or os.path.dirname(infile),
+                            os.path.basename(infile))
+        outfile = os.path.splitext(name)[0] + '.' + fileformat
+        if outfile in outfiles or os.path.abspath(outfile) == \
+           os.path.abspath(infile):
+            outfile = name + '.' + fileformat
+        outfiles.add(outfile)
+        if confidence < min_confidence:
+            unknown += [{'infile': infile, 'outfile': outfile, 
+                         'informat': None, 'bytes': os.stat(infile).st_size,
+                         'traces': 0, 'seconds': 0., 'MB/s': 0., 
+                         'error': 'unknown file format'}]
+        else:
+            jobs += [(infile, outfile, fileformat, informat)]
+    return files, jobs, unknown
+
+def _run_jobs(jobs, outdir, workers, maxtasks):
+    'yields reports of convert_file jobs run by a pool of processes'
+    if not jobs:
+        return
+    if outdir and not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    pool = Pool(max(1, min(workers, len(jobs))), maxtasksperchild=maxtasks)
+    try:
+        for report in pool.imap_unordered(_convert_job, jobs):
+            yield report
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def iter_convert(paths, outdir=None, fileformat='su', workers=4, 
+                 maxtasks=1, min_confidence=0.5):
+    '''converts all files of paths by a pool of worker processes, yields 
+    the report of each file as it is done'''
+
+    # INFO:
+    # This function converts files, directory trees and glob patterns of
+    # paths to fileformat. Input formats are sniffed in parallel first, 
+    # files without a known format (confidence < min_confidence) are 
+    # reported as errors without being converted. Each file is converted
+    # by one worker process (convert_file), a worker is replaced after 
+    # maxtasks files so its memory is returned to the system. Output files
+    # are written to outdir, or next to the input file, with the fileformat
+    # extension (i.e. line1.dzt >> line1.su, line1.dzt.su if line1.su is 
+    # taken).
+    #
+    # Input : PATHS, opt. outdir, fileformat = 'su' [DEFAULT], 'sgy' or 
+    #         'sg2', workers = 4 processes, maxtasks = 1 file per worker,
+    #         min_confidence = 0.5 of the format detection
+    #
+    # Output : yields report dictionaries (see convert_file) in order of
+    #          completion
+    #
+    # added: 18/10/26
+
+    files, jobs, unknown = _conversion_jobs(paths, outdir, fileformat, 
+                                            min_confidence)
+    for report in unknown:
+        yield report
+    for report in _run_jobs(jobs, outdir, workers, maxtasks):
+        yield report
+
+def convert_files(paths, outdir=None, fileformat='su', workers=4, 
+                  maxtasks=1, min_confidence=0.5):
+    'returns reports of iter_convert in order of the input files'
+    files, jobs, reports = _conversion_jobs(paths, outdir, fileformat,
+                                            min_confidence)
+    reports += list(_run_jobs(jobs, outdir, workers, maxtasks))
+    order = dict((infile, n) for n, infile in enumerate(files))
+    return sorted(reports, key=lambda report: order[report['infile']])
+
+def parse_arguments(argv=None):
+    'parses input arguments of the batch conversion'
+    parser = argparse.ArgumentParser(
+                          description='Batch binary file conversion.'
+                          + ' Automatic source file format detection.',
+                          conflict_handler='resolve')
+    parser.add_argument('-v','--version', help='Current version', 
+             action='version', version='%(prog)s ' + current_version)
+    parser.add_argument('paths', nargs='+', 
+             help='Input files, directories or glob patterns')
+    parser.add_argument('-outdir', default=None,
+             help='Output directory, default next to input files')
+    parser.add_argument('-fileformat', choices=['su','sgy','sg2'], 
+             default='su', help='Output file format, su [default], sgy'
+                        + ' or sg2')
+    parser.add_argument('-workers', type=int, default=4,
+             help='Number of worker processes, default 4')
+    parser.add_argument('-maxtasks', type=int, default=1,
+             help='Files converted per worker process before it is'
+                        + ' replaced, default 1')
+
+    return parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+def main(argv=None):
+    'batch conversion command, returns the number of failed files'
+    args = parse_arguments(argv)
+    failed = 0
+    total = [0, 0.]
+    start = time.time()
+    for report in iter_convert(args.paths, args.outdir, args.fileformat,
+                               args.workers, args.maxtasks):
+        if report['error'] is None:
+            total[0] += 1
+            total[1] += report['bytes']
+            print('%s -> %s  %i traces, %.1f MB in %.2f s, %.1f MB/s' % (
+                  report['infile'], report['outfile'], report['traces'],
+                  report['bytes'] / 2.**20, report['seconds'], 
+                  report['MB/s']))
+        else:
+            failed += 1
+            print('%s FAILED  %s' % (report['infile'], report['error']))
+    seconds = time.time() - start
+    print('%i files converted, %i failed, %.1f MB in %.2f s (%.1f MB/s)' % (
+          total[0], failed, total[1] / 2.**20, seconds,
+          total[1] / 2.**20 / max(seconds, 1e-9)))
+    return failed
+
+if __name__ == '__main__':
+    sys.exit(1 if main() else 0)
@@ -27,6 +27,16 @@ See Readme for detailed information
 
 """
 
+# SEG-Y header values set if not given when writing 'sgy'
+SEGY_mandatory = {'trid':1, 
+                  'data_sample_format_code':5,
+                  'trace_sorting_code':1,
+                  'measurement_system':1,
+                  'fixed_length_trace_flag':1,
+                  'seg_y_format_revision_number':0,
+                  'nr_of_hdr_records_2follow':0,
+                  'nr_tr_in_ensemble':1}
+
 # The format of the 400 byte long binary file header.
 SEGY_binary_file_header_format = [
     # [length, start byte, name, mandatory]
@@ -189,6 +199,15 @@ DZT_trace_header_format = [
     [12, 114, 'file_name', 'c'],
     [2, 126, 'checksum', 'H']];
 
+DZT_date_format = [
+    # date_c/date_m bytes in reverse order (32 bit little endian bit field)
+    [1, 0, 'year', 'x_rdo1+7ca1980'],
+    [2, 0, 'month', 'x_rdo0do5+7'],
+    [1, 1, 'day', 'x_rd4'],
+    [1, 2, 'hour', 'x_rdo3+7'],
+    [2, 2, 'minute', 'x_rd2do5+7'],
+    [1, 3, 'second', 'x_rd4']];
+
 
 SEG2_trace_header_format = [
     [2, True, True, 'ALIAS_FILTER', '3333.33 0', 1,'aff afs'], # aff and aft
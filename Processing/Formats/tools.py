@@ -27,15 +27,18 @@ See Readme for detailed information
 
 """
 
+import sys
 import argparse
+import operator
 import numpy as np
-from struct import pack, unpack
+from struct import Struct, calcsize, pack, unpack
 from Toolbox.utils import bit, read_bit_range
 from Formats.header import *
-from Formats.SEGY import SEGY_mandatory
 from datetime import datetime as dt
+from collections import OrderedDict
 import argparse
 
+current_version = "0.0.1"
 
 month_ind = {"JAN":1, "jan":1, "Jan":1, "1":0, "0":"Jan",
              "FEB":2, "feb":2, "Feb":2, "2":31, "31":"Feb",
@@ -56,6 +59,99 @@ symbolic_commands = {
     'm' : '*',
     't' : '/'}
 
+# integer operators of symbolic_commands, '/' is integer division
+_bit_operators = {
+    'a' : operator.add,
+    's' : operator.sub,
+    'm' : operator.mul,
+    't' : operator.floordiv}
+
+_bit_commands = {}
+
+def _compile_bit_range(command):
+    'returns function of byte values for a bit range command (after "r")'
+    terms = []
+    commands = command.split('c')
+    for byte, limits in enumerate(commands[0].split('d')[1::]):
+        if limits[0] == 'o':
+            limits = limits[1::].split('+')
+            start, end = int(limits[0]), int(limits[-1])
+        else:
+            start, end = 0, int(limits)
+        terms += [[byte, start, end - start + 1]]
+    arithmetic = [[_bit_operators[c[0]], int(c[1::])] for c in commands[1::]]
+
+    def bit_range(data):
+        value = 0
+        for byte, start, length in terms:
+            value = (value << length) | ((data[byte] >> start) 
+                                         & ((1 << length) - 1))
+        for function, c_val in arithmetic:
+            value = function(value, c_val)
+        return value
+    return bit_range
+
+def _compile_bit_test(command):
+    '''returns function of byte values for a test command ("id..."), 
+    returns (test passed, value)'''
+    test, value = command[2::].split('e', 1)
+    index, test_value = [int(val) for val in test.split('=')]
+    byte, index = divmod(index, 8)
+    if value[0] == 'r':
+        value = _compile_bit_range(value[1::])
+    else:
+        value = int(value)
+
+    def bit_test(data):
+        passed = ((data[byte] >> index) & 1) == test_value
+        if callable(value):
+            return passed, value(data)
+        return passed, value
+    return bit_test
+
+def compile_bit_command(command):
+    '''returns compiled function of a symbolic parse command, evaluates a 
+    byte string to an integer or an uint8 array (traces, bytes) to an 
+    integer array'''
+
+    # INFO:
+    # This function compiles a symbolic command (see parse_bit_command) 
+    # once into integer shift, mask and arithmetic operations. The compiled
+    # command takes the field bytes of one header as a binary string, or
+    # the field bytes of many headers as a numpy uint8 array with one row
+    # per header. Tests resolve to 0 if none passes. Commands are cached.
+    #
+    # Input : command
+    #
+    # Output : function of binary string or uint8 array
+    #
+    # added: 18/10/26
+
+    if command in _bit_commands:
+        return _bit_commands[command]
+    actions = command.split('_')[1::]
+    if actions[0][0] == 'r':
+        function = _compile_bit_range(actions[0][1::])
+    else:
+        tests = [_compile_bit_test(action) for action in actions]
+
+        def function(data):
+            return_value = 0
+            for test in tests:
+                passed, value = test(data)
+                if isinstance(passed, np.ndarray):
+                    return_value = np.where(passed, value, return_value)
+                elif passed:
+                    return_value = value
+            return return_value
+
+    def bit_command(data):
+        if isinstance(data, np.ndarray):
+            return function(data.astype('int64').T)
+        return function(bytearray(data))
+    _bit_commands[command] = bit_command
+    return bit_command
+
 def parse_bit_command(command, data):
     ' will parse & evaluate symbolic parse command'
     # INFO:
@@ -75,136 +171,672 @@ def parse_bit_command(command, data):
     #
     # added: 18/2/16 by Ralf Hansen
     
-    bit_string = ''
-    actions = command.split('_')[1::]
-    if len(actions) == 1:
-        if actions[0][0] == 'r':
-            bit_limits =  actions[0][1::].split('d')[1::]
-            for byte in range(len(bit_limits)):
-                if bit_limits[byte][0] == 'o':
-                    bit_limits[byte] = bit_limits[byte][1::]
-                    if '+' in bit_limits[byte]:
-                        lims = bit_limits[byte].split('+')
-                        bit_string = (bit_string + read_bit_range(
-                                      data[byte], int(lims[0]), int(lims[1])
-                                                                  ))
-                    else:
-                        bit_string = (bit_string + str(bit(
-                                      data[byte],int(bit_limits[byte][0]))
-                                                   ))
-                else:
-                    bit_string = (bit_string + read_bit_range(
-                                      data[byte], 0, int(bit_limits[byte][0])
-                                                              ))
-            return_value = int(bit_string, 2)
-            if len(bit_limits[-1]) > 2:
-                add_command = bit_limits[-1][1::].split('c')[1::]
-                for c in range(len(add_command)):
-                     c_in = add_command[c][0]
-                     c_val = add_command[c][1::]
-                     return_value = eval(str(return_value)
-                                         + symbolic_commands[c_in] 
-                                         + c_val) 
-
-    elif len(actions) > 1:
-        passed = False
-        for act in range(len(actions)):
-            tests = actions[act][2::].split('e')
-            if bit(data, int(tests[0][0])) == (int(tests[0][2::])):
-                if act == 0:
-                    return_value = int(tests[1])
-                else:
-                    if tests[1][0] == 'r':
-                        bit_limits =  tests[1][1::].split('d')[1::]
-                        for byte in range(len(bit_limits)):
-                            if bit_limits[byte][0] == 'o':
-                                bit_limits[byte] = bit_limits[byte][1::]
-                                if '+' in bit_limits[byte]:
-                                    lims = bit_limits[byte].split('+')
-                                    bit_string = (bit_string 
-                                                  + read_bit_range(
-                                       data[byte], int(lims[0]), int(lims[1])
-                                                                   )
-                                                  )
-                                else:
-                                    bit_string = (bit_string + str(bit(
-                                       data[byte], int(bit_limits[byte][0]))
-                                                                       )
-                                                  )
-                            else:
-                                bit_string = (bit_string + read_bit_range(
-                                      data[byte], 0, int(bit_limits[byte][0])
-                                                                          )
-                                              )
-                        return_value = int(bit_string, 2)
-                        if len(bit_limits[-1]) > 2:
-                            add_command = bit_limits[-1][1::].split('c')[1::]
-                            for c in range(len(add_command)):
-                                c_in = add_command[c][0]
-                                c_val = add_command[c][1::]
-                                return_value = eval(str(return_value)
-                                             + symbolic_commands[c_in] 
-                                             + c_val)
-            
-    return return_value
-
-def hdr2bin(trace_hdrs, header_format_file, file_format):
-    allhdrs = None
-    for field in header_format_file:
-        length, start, name, binary_format = field
-        # verify existing values and substitute, or =0
-        if name in trace_hdrs:
-            val = trace_hdrs[trace_hdrs.index(name)+1]
-        elif (file_format == 'sgy') and (name in SEGY_mandatory):
-            val = SEGY_mandatory[name]
-        else:
-            val = 0
-        # pack values as binary header string
-        if length > 4:
-            allhdr = pack('%s' % binary_format , 0)
-            for i in range((length)-1):
-                allhdr += pack('%s' % binary_format, 0)
-            hdr = allhdr
-        else:
-            hdr = pack('%s' % binary_format, val)
+    return compile_bit_command(command)(data)
+
+class HeaderCodec:
+    '''Precompiled binary codec of a header format table (Formats.header)
+       Packs or unpacks a whole header, or an array of headers, in one call'''
+
+    # INFO:
+    # This class compiles a header format table once into a single
+    # struct.Struct for one header and a numpy record dtype for arrays of
+    # headers. Fields with a bit parsing command ('x_...') are read from the
+    # raw header bytes with the compiled command (compile_bit_command). Numeric fields longer than 4
+    # bytes are written as zeros, as are unused and repeated fields (the last
+    # definition of a repeated field name is used, as when setting the
+    # values as attributes). Use compile_header to get a cached codec.
+    #
+    # Input : header format table, opt. byteorder = '=' [DEFAULT], '<', '>'
+    #
+    # added: 18/10/26
+
+    def __init__(self, header_format_file, byteorder='='):
+        self.byteorder = byteorder
+        self.size = 0
+        self.bit_fields = []
+        self._zero = []
+        last = {}
+        for field in header_format_file:
+            last[field[2]] = field
+            self.size = max(self.size, field[1] + field[0])
+        values = []
+        for field in header_format_file:
+            length, start, name, binary_format = field
+            if binary_format[0:2] == 'x_':
+                self.bit_fields += [[name, start, length, 
+                                     compile_bit_command(binary_format)]]
+            elif last[name] is not field:
+                continue
+            elif binary_format in ('c', 'x'):
+                values += [[start, name, '%is' % length, 'S%i' % length]]
+            else:
+                # 8 byte fields are read as a single long, as in SU.read
+                if length == 8:
+                    binary_format = 'q'
+                if length > 4:
+                    self._zero += [name]
+                if length == 8 or length == np.dtype(binary_format).itemsize:
+                    values += [[start, name, binary_format,
+                                byteorder + binary_format]]
+        values.sort()
+        # single header struct, unused bytes are padded
+        fmt = byteorder
+        pos = 0
+        for start, name, struct_format, dtype_format in values:
+            if start < pos:
+                raise ValueError('overlapping header field %s' % name)
+            if start > pos:
+                fmt += '%ix' % (start - pos)
+            fmt += struct_format
+            pos = start + calcsize(byteorder + struct_format)
+        if self.size > pos:
+            fmt += '%ix' % (self.size - pos)
+        self.struct = Struct(fmt)
+        self.names = [value[1] for value in values]
+        self._formats = [value[3] for value in values]
+        # record dtype for header arrays
+        self.dtype = np.dtype({'names': self.names,
+                               'formats': [value[3] for value in values],
+                               'offsets': [value[0] for value in values],
+                               'itemsize': self.size})
+
+    def unpack(self, binary, offset=0):
+        'returns dictionary of header values from binary string at offset'
+        hdr = dict(zip(self.names, self.struct.unpack_from(binary, offset)))
+        for name, start, length, command in self.bit_fields:
+            start += offset
+            hdr[name] = command(binary[start:start + length])
+        return hdr
+
+    def unpack_bits(self, raw):
+        '''returns dictionary of bit field value arrays of a uint8 array of 
+        headers (traces, header bytes)'''
+        hdrs = {}
+        for name, start, length, command in self.bit_fields:
+            hdrs[name] = command(raw[:, start:start + length])
+        return hdrs
+
+    def pack(self, hdr, defaults=None):
+        'returns binary header of a dictionary of values, missing values = 0'
+        values = []
+        for name, dtype_format in zip(self.names, self._formats):
+            if name in self._zero:
+                val = 0
+            elif name in hdr:
+                val = hdr[name]
+            elif defaults is not None and name in defaults:
+                val = defaults[name]
+            else:
+                val = 0
+            if not isinstance(val, str):
+                # cast to the header type, as pack_array
+                val = np.array(val).astype(dtype_format).item()
+            values += [val]
+        return self.struct.pack(*values)
+
+    def unpack_array(self, binary, count=-1, offset=0):
+        'returns record array of count headers from binary string at offset'
+        return np.frombuffer(binary, dtype=self.dtype, count=count,
+                             offset=offset)
+
+    def pack_array(self, hdrs, count, defaults=None):
+        '''returns record array of count headers from a HeaderTable or
+           dictionary of columns, missing values = 0'''
+        records = np.zeros(count, dtype=self.dtype)
+        for name in self.names:
+            if name in self._zero:
+                continue
+            elif name in hdrs:
+                records[name] = hdrs[name]
+            elif defaults is not None and name in defaults:
+                records[name] = defaults[name]
+        return records
+
+_codecs = {}
+
+def compile_header(header_format_file, byteorder='='):
+    'returns cached HeaderCodec of a header format table'
+    key = (id(header_format_file), byteorder)
+    if key not in _codecs:
+        _codecs[key] = HeaderCodec(header_format_file, byteorder)
+    return _codecs[key]
+
+def header_dtype(header_format_file=SU_trace_header_format, byteorder='='):
+    'returns numpy record dtype of the fields in a header format table'
+    return compile_header(header_format_file, byteorder).dtype
+
+def trace_dtype(ns, header_format_file=SU_trace_header_format,
+                data_format='float32', data_offset=None, itemsize=None,
+                byteorder='='):
+    'returns numpy record dtype of one trace, header fields + ns samples'
+    # INFO:
+    # This function appends ns samples of data_format as field 'data' 
+    # directly after the header fields of header_dtype, or at data_offset.
+    # Allows a binary file of fixed length traces to be mapped as a record
+    # array. itemsize sets the trace stride if traces are padded.
+    #
+    # Input : number of samples, opt. header format table, sample format,
+    #         data offset, itemsize in bytes, header byteorder
+    #
+    # Output : returns numpy dtype
+    #
+    # added: 18/10/26
+
+    hdr = header_dtype(header_format_file, byteorder)
+    data = np.dtype((data_format, ns))
+    if data_offset is None:
+        data_offset = hdr.itemsize
+    if itemsize is None:
+        itemsize = data_offset + data.itemsize
+    names = list(hdr.names) + ['data']
+    formats = [hdr.fields[name][0] for name in hdr.names] + [data]
+    offsets = [hdr.fields[name][1] for name in hdr.names] + [data_offset]
+    return np.dtype({'names': names, 'formats': formats,
+                     'offsets': offsets, 'itemsize': itemsize})
+
+# value range of integer column dtypes
+_ranges = {}
+
+def _column_holds(dtype, values):
+    'returns True if an integer column of dtype holds all values exactly'
+    if dtype.kind not in 'iu':
+        return True
+    if dtype not in _ranges:
+        _ranges[dtype] = (np.iinfo(dtype).min, np.iinfo(dtype).max)
+    low, high = _ranges[dtype]
+    if isinstance(values, (int, long, float, np.number)):
+        # single values of .fill()
+        return values % 1 == 0 and low <= values <= high
+    values = np.asarray(values)
+    if values.size == 0 or values.dtype.kind not in 'iuf':
+        return True
+    if values.dtype.kind == 'f' and not np.all(values == np.floor(values)):
+        return False
+    return values.min() >= low and values.max() <= high
+
+class HeaderTable:
+    '''Columnar trace header table, one typed numpy array per header field
+       table['gx'] returns the field column, table[n] the legacy header list
+       [name, value, name, value...] of trace n, table[start:end] a table of
+       the traces in range'''
+
+    # INFO:
+    # This class replaces the per trace header lists of the format readers.
+    # Field access is a single array operation instead of a list search for
+    # every trace. Columns follow the dtype of the header format table, a
+    # column is widened (i.e. to float64 or int64) when assigned values the
+    # header type does not hold, such as a fractional dt or a negative gain.
+    # Values are cast to the binary header type when written. Iterating or
+    # integer indexing a table presents the legacy list form, .tolist()
+    # returns all traces as lists for old callers. Rows of given 'tracl'
+    # values are found through a sorted 'tracl' index, rebuilt after the
+    # 'tracl' column is set through the table. Traces marked in .mask are
+    # written as zeros by write_binary, their sample data is not changed.
+    #
+    # Input : number of traces, opt. header format table
+    #
+    # added: 18/10/26
+
+    def __init__(self, traces=0, header_format_file=SU_trace_header_format,
+                 columns=None):
+        dtype = header_dtype(header_format_file)
+        self.fields = list(dtype.names)
+        if columns is None:
+            columns = {}
+            for name in self.fields:
+                columns[name] = np.zeros(traces, dtype=dtype.fields[name][0])
+        self.columns = columns
+        self.mask = None
+        self._index = None
+
+    @classmethod
+    def from_records(cls, records, header_format_file=SU_trace_header_format):
+        'returns table of column views into a trace record array'
+        columns = {}
+        for name in header_dtype(header_format_file).names:
+            columns[name] = records[name]
+        return cls(header_format_file=header_format_file, columns=columns)
+
+    @classmethod
+    def from_list(cls, trace_hdrs, header_format_file=SU_trace_header_format):
+        'returns table of legacy trace header lists'
+        table = cls(len(trace_hdrs), header_format_file)
+        for n in range(len(trace_hdrs)):
+            table.fill(n, dict(zip(trace_hdrs[n][0::2], trace_hdrs[n][1::2])))
+        return table
+
+    def __len__(self):
+        return len(self.columns[self.fields[0]])
+
+    def __contains__(self, field):
+        return field in self.columns
+
+    def __iter__(self):
+        for n in range(len(self)):
+            yield self[n]
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.columns[key]
+        if isinstance(key, (int, np.integer)):
+            trace_hdr = []
+            for name in self.fields:
+                trace_hdr += [name, self.columns[name][key]]
+            return trace_hdr
+        columns = {}
+        for name in self.fields:
+            columns[name] = self.columns[name][key]
+        table = HeaderTable(columns=columns)
+        table.fields = self.fields
+        if self.mask is not None:
+            table.mask = self.mask[key]
+        return table
+
+    def __setitem__(self, field, values):
+        self.assign(field, values)
+
+    def keys(self):
+        return list(self.fields)
+
+    def assign(self, field, values, rows=slice(None)):
+        '''sets values of field in rows (default all), the column is widened
+        if its dtype does not hold the values'''
+        column = self.columns[field]
+        if not _column_holds(column.dtype, values):
+            if np.asarray(values).dtype.kind == 'f':
+                column = column.astype('float64')
+            else:
+                column = column.astype('int64')
+            self.columns[field] = column
+        column[rows] = values
+        if field == 'tracl':
+            self._index = None
+
+    def row(self, n):
+        'returns dictionary of header values of trace n'
+        hdr = {}
+        for name in self.fields:
+            hdr[name] = self.columns[name][n]
+        return hdr
+
+    def rows(self, traces):
+        'returns sorted row indices of all traces with given tracl values'
+        if self._index is None:
+            order = np.argsort(self.columns['tracl'], kind='mergesort')
+            self._index = (order, self.columns['tracl'][order])
+        order, tracl = self._index
+        traces = np.atleast_1d(traces)
+        start = np.searchsorted(tracl, traces, 'left')
+        count = np.searchsorted(tracl, traces, 'right') - start
+        # expand each [start, start + count) range of the sorted index
+        pos = (np.repeat(start - np.cumsum(count) + count, count) 
+               + np.arange(count.sum()))
+        return np.unique(order[pos])
+
+    def set_mask(self, rows):
+        'marks rows as dead traces, written as zeros'
+        if self.mask is None:
+            self.mask = np.zeros(len(self), dtype=bool)
+        self.mask[rows] = True
 
-        if allhdrs == None:
-            allhdrs = hdr
+    def fill(self, n, source):
+        'sets header values of trace n from a dictionary or object attributes'
+        self._index = None
+        if isinstance(source, dict):
+            for name in self.fields:
+                if name in source:
+                    self.assign(name, source[name], n)
         else:
-            allhdrs += hdr
-    return allhdrs      
+            for name in self.fields:
+                self.assign(name, getattr(source, name), n)
 
-def write_binary(trace_header, data, data_format, outfile):
-    f = open(outfile, 'wb')
+    def tolist(self):
+        'returns legacy list of [name, value, name, value...] per trace'
+        return list(self)
 
-    if data_format == 'sg2':
-        file_header = make_SEG2_file_header(trace_header)
-        trace_start_pointer = len(file_header)
-        f.write(file_header)
-        for item in range(len(data)):
-            tmp_trace_header = make_SEG2_trace_header(trace_header[item])
-            f.write(tmp_trace_header)
-            f.write(data[item])
-            f.seek(item*4 + 32)
-            f.write(pack('i', trace_start_pointer))
-            trace_start_pointer += len(tmp_trace_header) + len(data[item])*4
-            f.seek(trace_start_pointer)
+class LazyStream:
+    '''Trace data decoded on first access. decode(n) returns trace n, 
+       decoded traces are kept in a least recently used cache of up to
+       cache_bytes. Indexing returns a trace, slices a list of traces'''
 
-    elif data_format == 'su':
-        for item in range(len(data)):
-            f.write(hdr2bin(trace_header[item],
-                            SU_trace_header_format, data_format))
-            f.write(data[item])
+    # INFO:
+    # This class stands in for the .stream list of a format class when only
+    # a few traces of a large file are looked at. Traces are decoded by the
+    # format class on first access and held until the cache exceeds 
+    # cache_bytes, the least recently used traces are dropped first. Traces
+    # assigned to the stream (i.e. zeroed) are kept outside of the cache.
+    #
+    # Input : number of traces, decode function, opt. cache_bytes
+    #
+    # added: 18/10/26
+
+    def __init__(self, traces, decode, cache_bytes=64*2**20):
+        self.traces = traces
+        self.decode = decode
+        self.cache_bytes = cache_bytes
+        self._cache = OrderedDict()
+        self._bytes = 0
+        self._set = {}
+
+    def __len__(self):
+        return self.traces
+
+    def __iter__(self):
+        for n in range(self.traces):
+            yield self[n]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[n] for n in range(*key.indices(self.traces))]
+        if not isinstance(key, (int, np.integer)):
+            return [self[n] for n in key]
+        n = int(key)
+        if n < 0:
+            n += self.traces
+        if not 0 <= n < self.traces:
+            raise IndexError('trace index out of range')
+        if n in self._set:
+            return self._set[n]
+        if n in self._cache:
+            # move to most recently used
+            trace = self._cache.pop(n)
+            self._cache[n] = trace
+            return trace
+        trace = self.decode(n)
+        self._cache[n] = trace
+        self._bytes += trace.nbytes
+        while self._bytes > self.cache_bytes and len(self._cache) > 1:
+            self._bytes -= self._cache.popitem(last=False)[1].nbytes
+        return trace
+
+    def __setitem__(self, n, trace):
+        if n < 0:
+            n += self.traces
+        if n in self._cache:
+            self._bytes -= self._cache.pop(n).nbytes
+        self._set[n] = trace
+
+def iter_records(binary_file, dtype, batch, offset=0, count=None):
+    'yields record arrays of up to batch records of dtype read from file'
+    # INFO:
+    # This function reads fixed length records from binary_file starting at
+    # byte offset, batch records at a time, so only one batch is held in
+    # memory. Reads to end of file, or count records if given.
+    #
+    # Input : INFILE, numpy dtype, batch size, opt. byte offset, 
+    #         opt. number of records
+    #
+    # Output : yields record arrays
+    #
+    # added: 18/10/26
+
+    # sub-array dtypes (i.e. DZT scans) are read as a single field record,
+    # np.fromfile does not count sub-array items as records
+    field = np.dtype(dtype).subdtype is not None
+    if field:
+        dtype = np.dtype([('data', dtype)])
+    with open(binary_file, 'rb') as f:
+        f.seek(offset)
+        while count is None or count > 0:
+            if count is None:
+                records = np.fromfile(f, dtype=dtype, count=batch)
+            else:
+                records = np.fromfile(f, dtype=dtype, count=min(batch, count))
+                count -= len(records)
+            if len(records) == 0:
+                break
+            if field:
+                records = records['data']
+            yield records
+
+def iter_batches(trace_hdrs, stream, batch):
+    'yields (header table, trace data) slices of batch traces of read data'
+    for start in range(0, len(trace_hdrs), batch):
+        yield trace_hdrs[start:start + batch], stream[start:start + batch]
+
+def detect_byteorder(binary, offset, fmt, plausible):
+    '''returns byte order '<' or '>' in which the values of fmt at offset of
+    binary pass plausible(*values), None if in neither'''
+    # if both pass, the order of the smaller values is taken, byte swapped
+    # counts and sizes are large
+    orders = []
+    for byteorder in '<>':
+        values = unpack(byteorder + fmt, binary[offset:offset + 
+                                                calcsize(byteorder + fmt)])
+        if plausible(*values):
+            orders += [(values, byteorder)]
+    if not orders:
+        return None
+    return min(orders)[1]
+
+def hdr2bin(trace_hdrs, header_format_file, file_format, byteorder='='):
+    'returns binary header string of a trace header list or dictionary'
+    if isinstance(trace_hdrs, list):
+        trace_hdrs = dict(zip(trace_hdrs[0::2], trace_hdrs[1::2]))
+    defaults = None
+    if file_format == 'sgy':
+        defaults = SEGY_mandatory
+    return compile_header(header_format_file, byteorder).pack(trace_hdrs, 
+                                                              defaults)
+
+class _MaskedStream:
+    'trace data with masked traces presented as zeros, data is not changed'
+    def __init__(self, stream, mask):
+        self.stream = stream
+        self.mask = mask
+
+    def __len__(self):
+        return len(self.stream)
+
+    def __getitem__(self, n):
+        if self.mask[n]:
+            return np.zeros_like(self.stream[n])
+        return self.stream[n]
+
+def _trace_block(data, start, stop, dtype='float32'):
+    'returns array of traces start to stop as dtype, None if ns differs'
+    if isinstance(data, np.ndarray) and data.ndim == 2:
+        return np.ascontiguousarray(data[start:stop], dtype=dtype)
+    traces = [np.asarray(data[n], dtype=dtype) for n in range(start, stop)]
+    if len(set([len(trace) for trace in traces])) > 1:
+        return None
+    return np.array(traces, dtype=dtype).reshape(len(traces), -1)
+
+def _write_traces(f, trace_header, data, data_format, byteorder='=',
+                  batch=4096):
+    'writes su/sgy traces of a header table, batch traces per write'
+    # headers and samples of a batch are packed into one contiguous buffer,
+    # files of traces of different length are written trace by trace
+    codec = compile_header(SU_trace_header_format, byteorder)
+    sample = np.dtype('float32').newbyteorder(byteorder)
+    defaults = None
+    if data_format == 'sgy':
+        defaults = SEGY_mandatory
+    mask = None
+    if isinstance(data, _MaskedStream):
+        data, mask = data.stream, data.mask
+    for start in range(0, len(data), batch):
+        stop = min(start + batch, len(data))
+        hdrs = codec.pack_array(trace_header[start:stop], stop - start,
+                                defaults).view(np.uint8).reshape(
+                                    stop - start, codec.size)
+        block = _trace_block(data, start, stop, sample)
+        if block is None:
+            for n in range(start, stop):
+                trace = np.asarray(data[n], dtype=sample)
+                if mask is not None and mask[n]:
+                    trace = np.zeros_like(trace)
+                f.write(hdrs[n - start].tostring())
+                f.write(trace)
+            continue
+        binary = np.empty((stop - start, codec.size + block.shape[1]*4),
+                          dtype=np.uint8)
+        binary[:, :codec.size] = hdrs
+        binary[:, codec.size:] = block.view(np.uint8)
+        if mask is not None:
+            binary[mask[start:stop], codec.size:] = 0
+        binary.tofile(f)
+
+class TraceWriter:
+    '''Incremental trace writer, batches of traces are appended with 
+    .append(HEADERS, DATA) and the file is completed on .close()'''
+
+    # INFO:
+    # Base class of SUWriter, SEGYWriter and SEG2Writer. .open() (called on
+    # creation) truncates OUTFILE, the file header is written with the first
+    # batch of traces, each .append() writes its traces straight to disk 
+    # and .close() completes the file. Headers are a HeaderTable or legacy
+    # header lists, traces masked in a HeaderTable are written as zeros.
+    # Only the appended batch is held in memory.
+    #
+    # >> with SUWriter('line.su') as out:
+    # >>     out.write(Formats.SEGY.SEGY(INFILE).iter_traces())
+    #
+    # Input : OUTFILE, opt. byteorder = '=' [DEFAULT], '<' or '>'
+    #
+    # added: 18/10/26
+
+    fileformat = None
+
+    def __init__(self, outfile, byteorder='='):
+        self.outfile = outfile
+        self.byteorder = byteorder
+        self.traces = 0
+        self._file = None
+        self.open()
+
+    def open(self):
+        'opens the output file, the file header is written on first append'
+        if self._file is not None and not self._file.closed:
+            raise ValueError('%s is already open' % self.outfile)
+        self._file = open(self.outfile, 'wb')
+        self.traces = 0
+
+    def append(self, trace_hdrs, stream):
+        'writes a batch of traces, header table or lists and trace data'
+        if len(stream) == 0:
+            return
+        if isinstance(trace_hdrs, HeaderTable) and trace_hdrs.mask is not None:
+            stream = _MaskedStream(stream, trace_hdrs.mask)
+        if self.traces == 0:
+            self._file.write(self._file_header(trace_hdrs))
+        self._append(trace_hdrs, stream)
+        self.traces += len(stream)
+
+    def write(self, batches):
+        'appends all (headers, trace data) batches, i.e. of .iter_traces()'
+        for trace_hdrs, stream in batches:
+            self.append(trace_hdrs, stream)
+
+    def close(self):
+        'completes and closes the file'
+        if self._file.closed:
+            return
+        self._close()
+        self._file.close()
+
+    def _file_header(self, trace_hdrs):
+        'returns file header written before the first trace'
+        return ''
+
+    def _close(self):
+        'completes the file before it is closed'
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class SUWriter(TraceWriter):
+    'Incremental SU writer, IEEE 32 bit float samples'
+    fileformat = 'su'
+
+    def _append(self, trace_hdrs, stream):
+        if not isinstance(trace_hdrs, HeaderTable):
+            trace_hdrs = HeaderTable.from_list(trace_hdrs)
+        _write_traces(self._file, trace_hdrs, stream, self.fileformat,
+                      self.byteorder)
+
+class SEGYWriter(SUWriter):
+    '''Incremental SEG-Y writer, the binary file header is made from the first
+    trace header, IEEE 32 bit float samples'''
+    fileformat = 'sgy'
+
+    def _file_header(self, trace_hdrs):
+        return hdr2bin(trace_hdrs[0], SEGY_binary_file_header_format,
+                       self.fileformat, self.byteorder)
 
+class SEG2Writer(TraceWriter):
+    '''Incremental SEG2 writer, a trace pointer table of max_traces is 
+    reserved with the file header and filled in on .close()'''
+    fileformat = 'sg2'
+
+    def __init__(self, outfile, byteorder='=', max_traces=1056):
+        # the pointer sub-block size is a 16 bit value
+        if not 0 < 4*max_traces <= 65532:
+            raise ValueError('SEG2 max_traces must be 1 to 16383')
+        self.max_traces = max_traces
+        TraceWriter.__init__(self, outfile, byteorder)
+
+    def open(self):
+        'opens the output file, the file header is written on first append'
+        TraceWriter.open(self)
+        self._pointers = []
+
+    def _file_header(self, trace_hdrs):
+        # file header values (spacing, date) are taken from the first batch
+        file_header = make_SEG2_file_header(trace_hdrs, self.byteorder,
+                                            4*self.max_traces)
+        self._position = len(file_header)
+        return file_header
+
+    def _append(self, trace_hdrs, stream):
+        if self.traces + len(stream) > self.max_traces:
+            raise ValueError('SEG2 pointer table is full, max_traces = %i' 
+                             % self.max_traces)
+        sample = np.dtype('float32').newbyteorder(self.byteorder)
+        for item in range(len(stream)):
+            trace_hdr = make_SEG2_trace_header(trace_hdrs[item], 
+                                               self.byteorder)
+            trace = np.asarray(stream[item], dtype=sample)
+            self._file.write(trace_hdr)
+            self._file.write(trace)
+            self._pointers += [self._position]
+            self._position += len(trace_hdr) + trace.nbytes
+
+    def _close(self):
+        # number of traces and trace pointers of the file descriptor block
+        if self.traces == 0:
+            return
+        self._file.seek(6)
+        self._file.write(pack(self.byteorder + 'H', self.traces))
+        self._file.seek(32)
+        self._file.write(pack(self.byteorder + '%ii' % self.traces, 
+                              *self._pointers))
+
+def write_binary(trace_header, data, data_format, outfile, byteorder='='):
+    # traces marked dead in a header table are written as zeros, byteorder
+    # '<' or '>' writes binary values little or big-endian, '=' native
+    if data_format == 'sg2':
+        # samples are written as IEEE 32 bit floats
+        writer = SEG2Writer(outfile, byteorder, max(len(data), 1056))
+    elif data_format == 'su':
+        writer = SUWriter(outfile, byteorder)
     elif data_format == 'sgy':
-        f.write(hdr2bin(trace_header[0], 
-                        SEGY_binary_file_header_format, data_format))
-        for item in range(len(data)):
-            f.write(hdr2bin(trace_header[item],
-                            SU_trace_header_format, data_format))
-            f.write(data[item])
-            
-    elif data_format == 'dat':
+        writer = SEGYWriter(outfile, byteorder)
+    else:
+        writer = None
+    if writer is not None:
+        with writer:
+            writer.append(trace_header, data)
+        return
+
+    if isinstance(trace_header, HeaderTable) and trace_header.mask is not None:
+        data = _MaskedStream(data, trace_header.mask)
+    f = open(outfile, 'wb')
+    if data_format == 'dat':
         for item in range(len(data)):
             f.write(" ".join(data[item].astype('str'))+'\r\n')
 
@@ -212,16 +844,33 @@ def write_binary(trace_header, data, data_format, outfile):
 
 def get_header(headers, field):
     'returns value for header field'
+    if isinstance(headers, HeaderTable):
+        return headers[field]
     content = []
     for trace_items in headers:
         if field in trace_items:
             content += [trace_items[trace_items.index(field)+1]]
     return np.array(content)
 
-def set_header(headers, field, values):
+def set_header(headers, field, values, traces=None):
     '''changes header field(s). Set field name and value(s). Array of 
     values must = number of traces. Integer value is applied to all
-    traces. An array of two values is interpreted as ['tracl','value']''' 
+    traces. An array of two values is interpreted as ['tracl','value']. 
+    opt. traces = list of tracl values the value(s) are applied to''' 
+
+    if isinstance(headers, HeaderTable):
+        # set through the table, the 'tracl' index is rebuilt if changed
+        if traces is not None:
+            headers.assign(field, values, headers.rows(traces))
+        elif isinstance(values, int) or len(values) == len(headers):
+            headers.assign(field, values)
+        elif len(values) == 2:
+            headers.assign(field, values[1], headers.rows(values[0]))
+        return
+
+    if traces is not None:
+        headers = [headers[n] for n in range(len(headers)) if
+                   headers[n][headers[n].index('tracl') + 1] in traces]
 
     # test if value is integer
     if isinstance(values, int):
@@ -243,15 +892,25 @@ def set_header(headers, field, values):
                     headers[trace].index(field) + 1
                               ] = values[1]
 
-def set_zero(headers, stream, traces):
-    'zeros specified trace(s) data.'
+def set_zero(headers, stream, traces, mask=False):
+    '''zeros specified trace(s) data. mask = True marks the traces dead in
+    a HeaderTable and leaves the data to be zeroed when written'''
     if isinstance(traces, int):
         traces = [traces]
     else:
         traces = map(int, traces)
+    if isinstance(headers, HeaderTable):
+        rows = headers.rows(traces)
+        if mask:
+            headers.set_mask(rows)
+        elif isinstance(stream, np.ndarray):
+            stream[rows] = 0
+        else:
+            for n in rows:
+                stream[n] = np.zeros_like(stream[n])
+        return
     for n in range(len(headers)):
         if (headers[n][headers[n].index('tracl')+1] in traces):
-            print headers[n][headers[n].index('tracl')+1]
             stream[n] = stream[n]*0
 
 def parse_arguments():
@@ -275,7 +934,7 @@ def parse_arguments():
     return parser.parse_args(sys.argv[1:])
 
 
-def make_SEG2_trace_header(hdr):
+def make_SEG2_trace_header(hdr, byteorder='='):
     '''
     SEG2 trace header creation. See SEG2_trace_header_format for headers
     accessed.
@@ -283,7 +942,8 @@ def make_SEG2_trace_header(hdr):
     data_format = 4
     samples = hdr[hdr.index('ns')+1]
     data_block_size = samples * data_format
-    trace_hdr_m = pack('2cH2ib','"','D', 484, data_block_size,
+    # trace descriptor block id 4422 Hex
+    trace_hdr_m = pack(byteorder + '2H2ib', 0x4422, 484, data_block_size,
                        samples, data_format)
     for i in range(19):
         trace_hdr_m += pack('b',0)
@@ -311,7 +971,7 @@ def make_SEG2_trace_header(hdr):
                 for i in range(n):
                     val += " " + str(hdr[hdr.index(su_h[i])+1])
             header_field = seg2_h + " " + str(val)
-            trace_hdr += pack('H', len(header_field) + 3)
+            trace_hdr += pack(byteorder + 'H', len(header_field) + 3)
             for t in header_field:
                 trace_hdr += pack('c', t)
             trace_hdr += pack('b',0)
@@ -322,7 +982,7 @@ def make_SEG2_trace_header(hdr):
             header_field = " " + seg2_h + " " + str(val) + " " + '\n'
             for t in header_field:
                 tmp_header += pack('c', t)
-            trace_hdr += pack('H', len(tmp_header)+5)
+            trace_hdr += pack(byteorder + 'H', len(tmp_header)+5)
             trace_hdr += tmp_header
             trace_hdr += pack('c2b','\n',0,0)   
 
@@ -339,8 +999,9 @@ def make_SEG2_trace_header(hdr):
     # return binary header
     return trace_hdr_m
 
-def make_SEG2_file_header(hdr):
-    'Creates SEG2 string header from header fields ns and dt'
+def make_SEG2_file_header(hdr, byteorder='=', pointer_bytes=4224):
+    '''Creates SEG2 string header from header fields ns and dt, with a trace
+    pointer sub-block of pointer_bytes'''
     traces = len(hdr)
     samples = hdr[0][hdr[0].index('ns')+1]
 
@@ -359,16 +1020,16 @@ def make_SEG2_file_header(hdr):
         spacing = "1.00"
 
     # doing directly, not elegant, but gets the job done
-    file_header = pack('2c','U',':') # 3a55 Hex
-    file_header += pack('H', 1)
-    file_header += pack('H', 4224)
+    file_header = pack(byteorder + 'H', 0x3a55) # 3a55 Hex
+    file_header += pack(byteorder + 'H', 1)
+    file_header += pack(byteorder + 'H', pointer_bytes)
     # 4224 bytes is based on 1064 bytes/traces
-    file_header += pack('H',traces)
+    file_header += pack(byteorder + 'H',traces)
     file_header += pack('4b',0,0,0,1)
     file_header += pack('c','\n')
     file_header += pack('b',0)
     # writing 0's for trace block descriptors for now
-    for n in range(18+4224):
+    for n in range(18+pointer_bytes):
         file_header += pack('b', 0)
     # set current date & time
     str(dt.now()).split()
@@ -378,12 +1039,12 @@ def make_SEG2_file_header(hdr):
            + month_ind[str(month_ind[str(date[1])])] 
            + "/" + date[0])
     time = (str(dt.now()).split()[1]).split(".")[0]
-    file_header += pack('H',31)
+    file_header += pack(byteorder + 'H',31)
     textual = "ACQUISITION_DATE " + str(date)
     for t in textual:
         file_header += pack('c',t)
     file_header += pack('b',0)
-    file_header += pack('H',28)
+    file_header += pack(byteorder + 'H',28)
     textual = "ACQUISITION_TIME " + str(time)
     for t in textual:
         file_header += pack('c',t)
@@ -395,7 +1056,7 @@ def make_SEG2_file_header(hdr):
          n, in_tr, in_m, seg2_h, h_val, scal, su_h = field
          if not in_tr and in_m:
              length = len(seg2_h) + len(h_val) + 4
-             file_header += pack('H',length)
+             file_header += pack(byteorder + 'H',length)
              textual = seg2_h + " " + h_val
              for t in textual:
                  file_header += pack('c',t)
@@ -408,7 +1069,7 @@ def make_SEG2_file_header(hdr):
             for t in textual:
                 tmp_header += pack('c', t)
 
-    file_header += pack('H', len(tmp_header)+5)
+    file_header += pack(byteorder + 'H', len(tmp_header)+5)
     file_header += tmp_header
     file_header += pack('c2b','\n',0,0)
     for zero in range(len(file_header) % 4 + 4):
@@ -30,10 +30,23 @@ See Readme for detailed information
 """
 
 import numpy as np
+from collections import OrderedDict
 from pyproj import Proj
 
 geometry_version = "0.0.3"
 
+# cos and sin of the quadrant start angles 0, 90, 180, 270
+_quadrant_cos = np.array([1., 0., -1., 0.])
+_quadrant_sin = np.array([0., 1., 0., -1.])
+
+# sample index maps of wslant, least recently used dropped first
+_wslant_maps = OrderedDict()
+_wslant_cache_size = 256
+
+# pyproj projections of utm, least recently used dropped first
+_projections = OrderedDict()
+_projection_cache_size = 16
+
 def inc2deg(data, angle, cmin=None, cmax=None):
     'will verify the calibration angle, can add cmin=..,cmax= for user input'
 
@@ -42,19 +55,20 @@ def inc2deg(data, angle, cmin=None, cmax=None):
     # to degrees based in data min,max. Overall limits = 0,360, or these
     # limits can be set by user defined input cmin=, cmax=
     #
-    # Input : data = array of floating point values
+    # Input : data = array of floating point values, any shape
     #
     # Output : returns data array of degree values
     #
     # added: 29/7/15 by Ralf Hansen
 
+    data = np.asarray(data, dtype='float64')
     # search for user defined input parameters
     if cmin == None: 
-        cmin = min(data)
+        cmin = data.min()
     if cmax == None: 
-        cmax = max(data)
+        cmax = data.max()
 
-    return ((data[:] - cmin)/(cmax - cmin)*angle)
+    return ((data - cmin)/(cmax - cmin)*angle)
 
 
 def radians(angle):
@@ -62,14 +76,14 @@ def radians(angle):
     # INFO:
     # This function converts degrees to radians
     #
-    # Input : angle in degrees
+    # Input : angle in degrees, value or array
     #
     # Output : angle in radians
     #
     # added: 29/7/15 by Ralf Hansen
 
 
-    return float(angle) * (np.pi/180)
+    return np.asarray(angle, dtype='float64') * (np.pi/180)
 
 def polar2cartesian(angle, hypo):
     'convert from polar to cartesian. returns the two axis component values'
@@ -92,6 +106,9 @@ def polar2cartesian(angle, hypo):
     #              |
     #             270
     #
+    # Angle and diameter can be values or arrays of any shape, the angle is
+    # broadcast against the diameter.
+    #
     # Input : angle, diameter
     #
     # Output : returns horizontal, vertical component
@@ -101,25 +118,45 @@ def polar2cartesian(angle, hypo):
     #               0 line set to horizontal
 
     # first determine angle is in 0..360
-    while angle < 0: angle += 360
-    while angle > 360: angle -= 360
-    # determine quadrant and calculate
-    if 0 <= angle <= 90:
-        hmult = np.sin(radians(90 - angle))*hypo
-        vmult = np.cos(radians(90 - angle))*hypo
-    elif 90 < angle <= 180:
-        hmult = -np.sin(radians(angle - 90))*hypo
-        vmult = np.cos(radians(angle - 90))*hypo
-    elif 180 < angle <= 270:
-        hmult = -np.sin(radians(270 - angle))*hypo
-        vmult = -np.cos(radians(270 - angle))*hypo
-    elif 270 < angle <= 360:
-        hmult = np.sin(radians(angle - 270))*hypo
-        vmult = -np.cos(radians(angle - 270))*hypo
+    angle = np.mod(angle, 360.)
+    # determine quadrant and angle within quadrant
+    quadrant = np.minimum(np.floor_divide(angle, 90.), 3).astype('int64')
+    angle = radians(angle - 90*quadrant)
+    cos = np.cos(angle)*hypo
+    sin = np.sin(angle)*hypo
+    # component signs per quadrant, exact at multiples of 90
+    hmult = _quadrant_cos[quadrant]*cos - _quadrant_sin[quadrant]*sin
+    vmult = _quadrant_sin[quadrant]*cos + _quadrant_cos[quadrant]*sin
 
     return hmult,vmult
     
-def wslant(data, dt, dx, wv = 1450):
+def _wslant_index(ns, dt, dx, wv):
+    'returns cached source sample index of each sample for wslant'
+    key = (ns, float(dt), float(dx), float(wv))
+    if key in _wslant_maps:
+        # move to most recently used
+        index = _wslant_maps.pop(key)
+        _wslant_maps[key] = index
+        return index
+    dx = float(dx)
+    wv = float(wv)
+    zero_time = dx/wv*10**6
+    measured_time = np.arange(ns, dtype='float64')*dt
+    # samples after zero time onset and their "correct" time position
+    onset = np.flatnonzero(measured_time > zero_time)
+    actual_index = np.floor(np.sqrt(measured_time[onset]**2 - zero_time**2)
+                            / dt + 0.5).astype('int64')
+    # each shifted position takes the first sample reaching it
+    index = np.arange(ns)
+    if len(onset) > 0:
+        shifted = np.arange(1, actual_index[-1] + 1)
+        index[shifted] = onset[np.searchsorted(actual_index, shifted)]
+    _wslant_maps[key] = index
+    if len(_wslant_maps) > _wslant_cache_size:
+        _wslant_maps.popitem(last=False)
+    return index
+
+def wslant(data, dt, dx, wv = 1450, inplace = True):
     'makes geometric travel time resampling upshift corrections'
     
     # INFO:
@@ -144,60 +181,112 @@ def wslant(data, dt, dx, wv = 1450):
     #          bx
     #
     #
-    # Input : trace data, time incr.[micro s], dx, [optional water velocity]
+    # The shift of each sample is computed once per ns, dt, dx and wv and
+    # applied to all traces at once. dx can be one value per trace.
+    #
+    # Input : trace data, time incr.[micro s], dx (value or array of one 
+    #         value per trace), [optional water velocity], 
+    #         [optional inplace = True changes data, False returns a copy]
     #
     # Output : returns shifted trace data
     #
     # added: 8/3/16 by Ralf Hansen
     
     # define dimesion & extend for dimensional handling
-    if np.size(data)/len(data) == 1:
-        data = [data]
+    traces = np.array(data, copy=not inplace or not 
+                      isinstance(data, np.ndarray))
+    single = traces.ndim == 1
+    if single:
+        traces = traces[np.newaxis]
+    ns = traces.shape[1]
 
-    # define time arrays & variables
-    ns = len(data[0])
-    dx = float(dx)
-    wv = float(wv)
-    zero_time = dx/wv*10**6
-    t = np.linspace(0, ns-1, num=ns)
-    measured_time = t*dt
-    actual_index = [0]
-    ref_index = [0]
-    ref = 0
-    
-    # generate actual time array
-    for i in range(ns):
-        # exclude all time before zero time onset
-        if measured_time[i] > zero_time:
-            index = int(round(
-                        np.sqrt((measured_time[i])**2-(zero_time)**2)/dt
-                              ))
-            actual_index += [index]
-            
-            # shift sample to "correct" time position
-            for j in range(index-ref):
-                for k in range(len(data)):
-                    data[k][j+ref+1] = data[k][i]
-            ref = index
-            
-    # return to input dimension
-    if len(data) == 1:
-        data = data[0]
+    # shift samples to "correct" time position, grouped by dx
+    dx = np.asarray(dx, dtype='float64')
+    if dx.ndim == 0:
+        traces[:] = traces[:, _wslant_index(ns, dt, dx, wv)]
+    else:
+        values, groups = np.unique(dx, return_inverse=True)
+        for n in range(len(values)):
+            rows = np.flatnonzero(groups == n)
+            traces[rows] = traces[rows][:, _wslant_index(ns, dt, values[n],
+                                                         wv)]
 
-    return data
+    # return to input dimension
+    if single:
+        traces = traces[0]
+    if inplace and isinstance(data, np.ndarray):
+        return data
+    if inplace:
+        # write back to the input list of traces
+        if single:
+            data[:] = traces
+        else:
+            for k in range(len(data)):
+                data[k][:] = traces[k]
+        return data
+    return traces
     
-def utm(Lat, Lon, utmZone):
+def projection(zone, south = False, ellps = 'WGS84'):
+    'returns cached pyproj UTM projection of zone, hemisphere and ellipsoid'
+    key = (int(zone), bool(south), ellps)
+    if key in _projections:
+        # move to most recently used
+        p = _projections.pop(key)
+    elif south:
+        p = Proj(proj='utm', zone=key[0], ellps=ellps, south=True)
+    else:
+        p = Proj(proj='utm', zone=key[0], ellps=ellps)
+    _projections[key] = p
+    if len(_projections) > _projection_cache_size:
+        _projections.popitem(last=False)
+    return p
+
+def utm_zone(Lat, Lon):
+    'returns UTM zone and southern hemisphere flag arrays of Lat, Lon'
+    Lon = np.asarray(Lon, dtype='float64')
+    zone = (np.floor((Lon + 180)/6).astype('int64') % 60) + 1
+    return zone, np.asarray(Lat) < 0
+
+def utm(Lat, Lon, utmZone = None, south = None, ellps = 'WGS84', 
+        chunk = 2**20):
     'Apply UTM projection to infile data. Requires pyproj and uses WGS84'
     # INFO:
     # This function takes Lat and Lon and projected to UTM coordinates of
-    # defined zone.
+    # defined zone. Without a zone, each point is projected in its own zone
+    # and hemisphere (see utm_zone), points are grouped by zone so each
+    # zone is projected in one call. Projections are cached per zone, 
+    # hemisphere and ellipsoid, and points projected chunk at a time.
     #
-    # Input : Lat, Lon, UTM zone
+    # Input : Lat, Lon, opt. UTM zone [DEFAULT = zone of each point], 
+    #         south = southern hemisphere [DEFAULT = False for a given zone,
+    #         Lat < 0 otherwise], ellps = 'WGS84', chunk = points per call
     #
     # Output : returns projected UTM coordinates
     #
     # added: 21/3/16 by Ralf Hansen
     
-    p = Proj(proj='utm', zone=int(utmZone), ellps='WGS84')
-    return np.array(p(Lon, Lat)).T  # must be Lon, Lat 
-    
+    Lat = np.asarray(Lat, dtype='float64')
+    Lon = np.asarray(Lon, dtype='float64')
+    shape = np.broadcast(Lat, Lon).shape
+    Lat = np.broadcast_to(Lat, shape).ravel()
+    Lon = np.broadcast_to(Lon, shape).ravel()
+    if utmZone is None:
+        zone, hemisphere = utm_zone(Lat, Lon)
+        if south is not None:
+            hemisphere[:] = south
+    else:
+        zone = np.full(len(Lat), int(utmZone), dtype='int64')
+        hemisphere = np.full(len(Lat), bool(south), dtype='bool')
+
+    xy = np.empty((len(Lat), 2), dtype='float64')
+    keys, groups = np.unique(zone*2 + hemisphere, return_inverse=True)
+    for n in range(len(keys)):
+        p = projection(keys[n] // 2, keys[n] % 2, ellps)
+        if len(keys) == 1:
+            rows = np.arange(len(Lat))
+        else:
+            rows = np.flatnonzero(groups == n)
+        for start in range(0, len(rows), chunk):
+            part = rows[start:start + chunk]
+            xy[part, 0], xy[part, 1] = p(Lon[part], Lat[part]) # Lon, Lat
+    return xy.reshape(shape + (2,))
@@ -27,8 +27,11 @@ See Readme for detailed information
 
 """
 
-import sys, os
+import sys, os, re, glob
+import importlib
 import numpy as np
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 from struct import pack, unpack
 
 utils_version = "0.0.2"
@@ -69,10 +72,13 @@ def read_bit_range(byte, start, end):
     # Output : returns bit string
     #
     # added: 18/2/16 by Ralf Hansen
-    bit_string =''
-    for i in range(end-start+1):
-        bit_string = str(bit(byte, i+start)) + bit_string
-    return bit_string
+    length = end - start + 1
+    if length < 1:
+        return ''
+    value = 0
+    for i, char in enumerate(byte):
+        value |= ord(char) << 8*i
+    return format((value >> start) & ((1 << length) - 1), '0%ib' % length)
 
 class fdtect:
     '''File assessment; gives file size, reads binary data, tests formats
@@ -82,18 +88,21 @@ class fdtect:
                  y.bin (binary data of file)
                  after y.test*(): y.valid (True/False)
                                   y.fileformat (i.e. 'su')
+                                  y.confidence (0 to 1)
        Tested file formats: Seismic Unix SU
                          SEG-Y
                          Geometrics SEG-2 
                          GSSI DZT
                          Imagenix (81e, 851, 852)
+                         SICK 510 ascii (testAll only)
     ''' 
     # INFO:
-    # This class does a rudimentary check on a file for known designators
-    # and identifies the appropriate format. Please NOTE that by the 
-    # inherent limitations of the crude test scenario, a check may
-    # pass a test irrespective of actual format.
-    # Currently can verify SEG2, SEGY, SU, DZT, Im88b, Im851 formats
+    # This class checks a file for known designators and identifies the
+    # appropriate format. The tests are the sniffers registered for sniff 
+    # (see register_sniffer), testAll() takes the most likely format as 
+    # sniff does. Please NOTE that by the inherent limitations of the crude
+    # test scenario, a check may pass a test irrespective of actual format.
+    # Kept for old callers, use sniff(INFILE) instead.
     # Call testAll(INFILE) or specific i.e. test4SU(INFILE)
     #
     # Input : INFILE
@@ -106,108 +115,323 @@ class fdtect:
         self.binary_file = binary_file
         self.fileformat = 'none'
         self.valid = False
+        self.confidence = 0.
         self.filesize = os.stat(binary_file).st_size
-        with open(binary_file,'r') as f:
+        with open(binary_file,'rb') as f:
             self.bin = f.read(5000)
         self.filesize = os.stat(binary_file).st_size
 
+    def _test(self, fileformats):
+        'sets the most likely of fileformats if more likely than the last'
+        for fileformat, (confidence, options) in _sniff_tests(
+                                        self.binary_file, fileformats).items():
+            if confidence > self.confidence:
+                self.valid = True
+                self.fileformat = fileformat
+                self.confidence = confidence
+
     def testAll(self):
-        ext = self.binary_file.split('.')[-1]
-        if not self.valid:
-            self.test4SGY()
-        if not self.valid:
-            self.test4SU()
-        elif self.valid and (ext == 'su'):
-            self.test4SU()
-        if not self.valid:
-            self.test4SEG2()
-        elif self.valid and (ext == 'sg2' or ext == 'dat'):
-            self.test4SEG2()
-        if not self.valid:
-            self.test4DZT()
-        elif self.valid and (ext == 'dzt'):
-            self.test4DZT()
-        if not self.valid:
-            self.test4Im()
-        elif self.valid and (ext[0] == '8'):
-            self.test4Im()
+        self._test(sniffers.keys())
 
     def test4SGY(self):
-        if self.filesize > 3840:
-            div = unpack('H', self.bin[3219:3221])[0]*4 + 240
-            if ( isinstance(div,int) and 
-                 (self.filesize -3600) % div == 0 ):
-                self.valid = True
-                self.fileformat = 'sgy'
+        self._test(['sgy'])
 
     def test4SU(self):
-        if self.filesize > 240:
-            div = unpack('H',self.bin[114:116])[0] *4 + 240
-            if isinstance(div,int) and self.filesize % div == 0:
-                self.valid = True
-                self.fileformat = 'su'
+        self._test(['su'])
         
     def test4SEG2(self):
-        if self.filesize > 4220:
-            if ( "".join(unpack('2c', self.bin[0:2])) == 'U:' or
-                 "".join(unpack('2c', self.bin[0:2])) == ':U' ):
-                self.valid = True
-                self.fileformat = 'sg2'
+        self._test(['sg2'])
 
     def test4DZT(self):
-        if self.filesize > 1024:
-            div = unpack('H', self.bin[4:6])[0]
-            if div == 0 : div = 1
-            if (isinstance(div,int) and 
-                (self.filesize - 1024) % div == 0 ):
-                self.valid = True
-                self.fileformat = 'dzt'
+        self._test(['dzt'])
 
     def test4Im(self):
-        if self.filesize > 112:
-            Im_id = "".join(unpack('3c',self.bin[0:3])).lower()
-            if Im_id == '851' or Im_id == '81e' or Im_id == '852':
-                self.valid = True
-                self.fileformat = Im_id
+        self._test(['81e', '851', '852'])
                 
-                
-def txt2array(infile, delim = ' '):
+# format sniffers, fileformat : [header bytes, test, reader]
+sniffers = OrderedDict()
+_readers = {}
+
+def register_sniffer(fileformat, nbytes, test, reader = None):
+    'registers a format sniffer for sniff, see INFO'
+
+    # INFO:
+    # A sniffer tests the first nbytes of a file for a format. 
+    # test(prefix, filesize, extension) returns a confidence from 0 (not 
+    # the format) to 1 (certain), or (confidence, options) with reader 
+    # options found in the file, i.e. {'byteorder': '>'} (see 
+    # sniff_options). reader = 'module:class' names the reader
+    # class of the format, imported on first use through reader(). 
+    # Registering a fileformat again replaces its sniffer.
+    #
+    # Input : fileformat (i.e. 'su'), header bytes, test, opt. reader
+    #
+    # added: 18/10/26
+
+    sniffers[fileformat] = [nbytes, test, reader]
+
+def _sniff_tests(infile, fileformats):
+    'returns dictionary of fileformat : (confidence, options) of a file'
+    nbytes = max([sniffers[fileformat][0] for fileformat in fileformats] 
+                 + [0])
+    filesize = os.stat(infile).st_size
+    with open(infile, 'rb') as f:
+        prefix = f.read(nbytes)
+    ext = os.path.splitext(infile)[1][1::].lower()
+    results = OrderedDict()
+    for fileformat in fileformats:
+        nbytes, test, cls = sniffers[fileformat]
+        if len(prefix) < nbytes:
+            continue
+        result = test(prefix, filesize, ext)
+        if not isinstance(result, tuple):
+            result = (result, {})
+        results[fileformat] = result
+    return results
+
+def sniff(infile):
+    'returns most likely (fileformat, confidence) of a file, ("none", 0)'
+    best = ['none', 0.]
+    for fileformat, (confidence, options) in _sniff_tests(
+                                              infile, sniffers.keys()).items():
+        if confidence > best[1]:
+            best = [fileformat, confidence]
+    return tuple(best)
+
+def sniff_options(infile, fileformat):
+    '''returns dictionary of reader options of fileformat found by its 
+    sniffer in a file, i.e. {'byteorder': '>'}'''
+    if fileformat not in sniffers:
+        return {}
+    return dict(_sniff_tests(infile, [fileformat]).get(fileformat, 
+                                                        (0., {}))[1])
+
+def sniff_files(paths, workers = 8):
+    '''returns ordered dictionary of file : (fileformat, confidence) of all 
+    files of paths (files, directory trees or glob patterns) sniffed by a
+    pool of workers threads'''
+    if isinstance(paths, str):
+        paths = [paths]
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                files += [os.path.join(root, name) for name in sorted(names)]
+        elif os.path.isfile(path):
+            files += [path]
+        else:
+            files += sorted(glob.glob(path))
+    pool = ThreadPool(max(1, min(workers, len(files))))
+    try:
+        results = pool.map(_sniff_file, files)
+    finally:
+        pool.close()
+        pool.join()
+    return OrderedDict(zip(files, results))
+
+def _sniff_file(infile):
+    'sniff of a file, unreadable files are ("none", 0)'
+    try:
+        return sniff(infile)
+    except (IOError, OSError):
+        return ('none', 0.)
+
+def reader(fileformat):
+    'returns reader class of fileformat, the module is imported on first use'
+    if fileformat not in _readers:
+        if fileformat not in sniffers or sniffers[fileformat][2] is None:
+            raise ValueError('no reader for file format %s' % fileformat)
+        module, cls = sniffers[fileformat][2].split(':')
+        _readers[fileformat] = getattr(importlib.import_module(module), cls)
+    return _readers[fileformat]
+
+def _sniff_sgy(prefix, filesize, ext):
+    'SEG-Y, 3200 byte text header, binary header and fixed length traces'
+    confidence = 0.
+    options = {}
+    for byteorder in '<>':
+        ns = unpack(byteorder + 'H', prefix[3220:3222])[0]
+        code = unpack(byteorder + 'H', prefix[3224:3226])[0]
+        # bytes per sample of the data sample format code
+        size = {1: 4, 2: 4, 3: 2, 5: 4, 8: 1}.get(code, 4)
+        if (filesize > 3840 and ns > 0 and 
+            (filesize - 3600) % (ns*size + 240) == 0):
+            confidence = 0.6
+            # byte order of a known format code, big-endian if both
+            if code in (1, 2, 3, 5, 8) or not options:
+                options = {'byteorder': byteorder}
+    # text header starts with 'C' in EBCDIC or ascii
+    if confidence > 0 and prefix[0] in '\xc3C':
+        confidence = 0.9
+    if ext in ('sgy', 'segy'):
+        confidence = max(confidence, 0.3) + 0.05
+    return min(confidence, 1.), options
+
+def _sniff_su(prefix, filesize, ext):
+    'SU, fixed length traces of a 240 byte header and float samples'
+    # byte order of ns dividing the file into whole traces, the smaller ns
+    # if both do, as in Formats.SU
+    orders = []
+    for byteorder in '<>':
+        ns = unpack(byteorder + 'H', prefix[114:116])[0]
+        if filesize >= 240 and ns > 0 and filesize % (ns*4 + 240) == 0:
+            orders += [(ns, byteorder)]
+    if not orders:
+        return 0.
+    if ext == 'su':
+        return 0.95, {'byteorder': min(orders)[1]}
+    return 0.5, {'byteorder': min(orders)[1]}
+
+def _sniff_seg2(prefix, filesize, ext):
+    'SEG2, file descriptor block id 0x3a55'
+    if prefix[0:2] == 'U:':
+        return 0.95, {'byteorder': '<'}
+    if prefix[0:2] == ':U':
+        return 0.95, {'byteorder': '>'}
+    return 0.
+
+def _sniff_dzt(prefix, filesize, ext):
+    'DZT, 1024 byte header blocks with samples, data bits and data offset'
+    for byteorder in '<>':
+        tag, data_offset, ns, data_bits = unpack(byteorder + '4H', 
+                                                 prefix[0:8])
+        if (filesize < 1024 or ns == 0 or data_bits not in (8, 16, 32) or 
+            data_offset == 0):
+            continue
+        if ext == 'dzt':
+            return 0.95, {'byteorder': byteorder}
+        return 0.4, {'byteorder': byteorder}
+    return 0.
+
+def _sniff_imagenix(image_id):
+    'returns sniffer of Imagenix file format image_id (i.e. "852")'
+    def _sniff_im(prefix, filesize, ext):
+        if prefix[0:3].lower() != image_id:
+            return 0.
+        # data format designator
+        if prefix[100:103] in ('IPX', 'IMX', 'IGX'):
+            return 0.95
+        return 0.7
+    return _sniff_im
+
+def _sniff_sick(prefix, filesize, ext):
+    'SICK 510 ascii data, comma deliminated numeric lines'
+    lines = prefix.split('\n')
+    if len(lines) < 3:
+        return 0.
+    for line in lines[1:-1]:
+        fields = line.strip("\r").split(',')
+        if len(fields) < 9 or not all(isnumeric(field) for field in 
+                                      fields[0:8]):
+            return 0.
+    return 0.6
+
+register_sniffer('sgy', 3226, _sniff_sgy, 'Formats.SEGY:SEGY')
+register_sniffer('su', 240, _sniff_su, 'Formats.SU:SU')
+register_sniffer('sg2', 2, _sniff_seg2, 'Formats.SEG2:SEG2')
+register_sniffer('dzt', 1024, _sniff_dzt, 'Formats.DZT:DZT')
+for image_id in ('81e', '851', '852'):
+    register_sniffer(image_id, 112, _sniff_imagenix(image_id),
+                     'Formats.IMxxx:Imagenix')
+register_sniffer('sick', 2048, _sniff_sick, 'Formats.SICK:SICK510')
+
+def txt2array(infile, delim = ' ', chunk_bytes = 16*2**20):
     'will convert input numeric ascii data file to numpy array, deliminator can be set'
     
     # INFO:
     # This function turns a ascii data file into a numpy floating point array
     # Automatically excludes all text, including scientific notation. 
     # Uses first line as collumn reference, and excludes all lines that do
-    # not meet the numeric collumn total
+    # not meet the numeric collumn total. The file is parsed chunk_bytes at
+    # a time (see iter_txt) into an array grown as needed.
     #
-    # Input : INFILE, opt. delim = ' ' [DEFAULT]
+    # Input : INFILE, opt. delim = ' ' [DEFAULT], chunk_bytes
     #
     # Output : returns array of dimension = # of entries and # of lines
     #
     # added: 14/3/16 by Ralf Hansen
     
+    data = None
+    rows = 0
+    for block in iter_txt(infile, delim, chunk_bytes = chunk_bytes):
+        if data is None:
+            data = np.empty((max(len(block), 1024), block.shape[1]), 
+                            dtype = 'float32')
+        if rows + len(block) > len(data):
+            # grow geometrically
+            data.resize((max(2*len(data), rows + len(block)), 
+                         data.shape[1]), refcheck = False)
+        data[rows:rows + len(block)] = block
+        rows += len(block)
+    if data is None:
+        return np.zeros((0, 0), dtype = 'float32')
+    data.resize((rows, data.shape[1]), refcheck = False)
+    return data
+
+def iter_txt(infile, delim = ' ', batch = None, chunk_bytes = 16*2**20):
+    '''yields float32 arrays of up to batch lines of numeric ascii data,
+    see txt2array. The file is read chunk_bytes at a time'''
+    with open(infile, 'rb') as f:
+        absref = None
+        rest = ''
+        while True:
+            chunk = f.read(chunk_bytes)
+            # parse whole lines only, carry the last partial line
+            text = rest + chunk
+            if len(chunk) > 0:
+                end = text.rfind('\n') + 1
+                text, rest = text[0:end], text[end::]
+            if len(text) > 0:
+                if text[-1] == '\n':
+                    text = text[0:-1]
+                if absref is None:
+                    # first line defines the collumn reference
+                    absref = len(_numeric_fields(text.split('\n', 1)[0],
+                                                 delim))
+                    invalid = _invalid_line(delim, absref)
+                data = _parse_txt(text, delim, absref, invalid)
+                if batch is None:
+                    batch_size = max(len(data), 1)
+                else:
+                    batch_size = batch
+                for start in range(0, len(data), batch_size):
+                    yield data[start:start + batch_size]
+            if len(chunk) == 0:
+                break
+
+# numeric value as tested by isnumeric
+_numeric = r'[-+e]*\d[-+e\d]*(?:\.[-+e]*\d[-+e\d]*)*'
+
+def _invalid_line(delim, absref):
+    'returns regular expression matching lines not of absref numeric values'
+    if absref == 0:
+        return None
+    line = _numeric + '(?:%s%s){%i}' % (re.escape(delim), _numeric, 
+                                        absref - 1)
+    return re.compile(r'^(?!%s\r?$)' % line, re.M)
+
+def _numeric_fields(line, delim):
+    'returns numeric fields of a line'
+    return [value for value in line.strip("\r").strip("\n").split(delim)
+            if isnumeric(value)]
+
+def _parse_txt(text, delim, absref, invalid):
+    'returns float32 array of lines of text with absref numeric fields'
+    lines = text.count('\n') + 1
+    if invalid is not None and invalid.search(text) is None:
+        # all lines are absref numeric values, convert in one pass
+        data = np.fromstring(text.replace('\r', '').replace('\n', delim),
+                             dtype = 'float32', sep = delim)
+        if len(data) == lines*absref:
+            return data.reshape(lines, absref)
+    # line by line for lines of text or other collumn counts
     data = []
-    with open(infile) as f:
-        # Read file line by line
-        setref = True
-        for newline in f.readlines():
-            cref = 0
-            # assign to object stream 
-            numeric = []
-            tmp = newline.strip("\r").strip("\n").split(delim)
-            for index in range(len(tmp)):
-                if isnumeric(tmp[index]):
-                    cref += 1
-                    numeric += [tmp[index]]
-            if setref:
-                absref = cref
-                setref = False
-
-            if cref == absref:
-                print absref
-                data += [numeric]
-
-    return np.array(data, dtype = 'float32')
+    for line in text.split('\n'):
+        numeric = _numeric_fields(line, delim)
+        if len(numeric) == absref:
+            data += [numeric]
+    return np.array(data, dtype = 'float32').reshape(len(data), absref)
     
 def isnumeric(value):
     ' will take a string object and verifies if it is numeric'
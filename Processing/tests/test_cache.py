@@ -0,0 +1,79 @@
+#!/bin/python env
+'''regression tests of Formats.cache, run from Processing with
+>> python -m unittest discover tests'''
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+                                                             __file__))))
+import Formats.cache as cache
+from Formats.tools import HeaderTable, SUWriter
+from Formats.SU import SU
+
+def write_su(path, offset=0., traces=4, ns=16):
+    'writes a small SU file, samples start at offset'
+    trace_hdrs = HeaderTable(traces)
+    trace_hdrs['tracl'] = np.arange(1, traces + 1)
+    trace_hdrs['ns'] = ns
+    with SUWriter(path) as out:
+        out.append(trace_hdrs, offset + np.arange(traces * ns, 
+                   dtype='float32').reshape(traces, ns))
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache_dir = cache.cache_dir
+        cache.cache_dir = os.path.join(self.dir, 'cache')
+        self.path = os.path.join(self.dir, 'line.su')
+        write_su(self.path)
+
+    def tearDown(self):
+        cache.cache_dir = self.cache_dir
+        shutil.rmtree(self.dir)
+
+    def test_hit(self):
+        first = cache.open_cached(self.path)
+        second = cache.open_cached(self.path)
+        self.assertEqual(len(cache.cache_info()), 1)
+        self.assertTrue(isinstance(second, SU))
+        self.assertTrue(np.array_equal(second.stream, first.stream))
+        self.assertTrue(np.array_equal(second.header('tracl'), [1, 2, 3, 4]))
+
+    def test_mtime_reloads(self):
+        cache.open_cached(self.path)
+        entry = cache.cache_info()[0]['path']
+        # same size, new samples and mtime
+        write_su(self.path, 100.)
+        mtime = os.path.getmtime(self.path) + 10
+        os.utime(self.path, (mtime, mtime))
+        data = cache.open_cached(self.path)
+        self.assertEqual(data.stream[0][0], 100.)
+        info = cache.cache_info()
+        # the entry of the old file is dropped
+        self.assertEqual(len(info), 1)
+        self.assertNotEqual(info[0]['path'], entry)
+        self.assertEqual(cache.open_cached(self.path).stream[0][0], 100.)
+
+    def test_evict_and_purge(self):
+        other = os.path.join(self.dir, 'other.su')
+        write_su(other)
+        cache.open_cached(self.path)
+        cache.open_cached(other)
+        self.assertEqual(len(cache.cache_info()), 2)
+        self.assertEqual(cache.purge_cache(other), 1)
+        self.assertEqual([entry['infile'] for entry in cache.cache_info()], 
+                         [os.path.abspath(self.path)])
+        cache.open_cached(other)
+        self.assertEqual(cache.evict_cache(budget=0), 2)
+        self.assertEqual(cache.cache_info(), [])
+
+    def test_lazy_not_cached(self):
+        cache.open_cached(self.path, lazy=True)
+        self.assertEqual(cache.cache_info(), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+#!/bin/python env
+'''regression tests of Formats.cloud, run from Processing with
+>> python -m unittest discover tests'''
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+                                                             __file__))))
+from Formats.cloud import write_cloud
+
+class TestPointCloud(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.points = np.arange(24, dtype='float32').reshape(6, 4)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_ply(self):
+        path = os.path.join(self.dir, 'scan.ply')
+        write_cloud(path, [self.points[0:4], self.points[4:]])
+        with open(path, 'rb') as f:
+            binary = f.read()
+        header, data = binary.split('end_header\n')
+        lines = header.split('\n')
+        # single space separated tokens, the count a plain integer
+        self.assertEqual(lines[2].split(' ')[0:2], ['element', 'vertex'])
+        self.assertEqual(len(lines[2].split(' ')), 3)
+        self.assertEqual(int(lines[2].split(' ')[2]), 6)
+        self.assertTrue(np.array_equal(np.frombuffer(data, '<f4').reshape(
+                                           6, 4), self.points))
+
+    def test_npy(self):
+        path = os.path.join(self.dir, 'scan.npy')
+        write_cloud(path, [self.points[0:4], self.points[4:]])
+        self.assertTrue(np.array_equal(np.load(path), self.points))
+
+if __name__ == '__main__':
+    unittest.main()
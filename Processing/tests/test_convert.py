@@ -0,0 +1,102 @@
+#!/bin/python env
+'''regression tests of Formats.convert, run from Processing with
+>> python -m unittest discover tests'''
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+                                                             __file__))))
+import Formats.convert as convert
+from Formats.tools import HeaderTable, SUWriter
+from Formats.SU import SU
+
+def write_su(path, traces=6, ns=32):
+    'writes a small SU file of traces numbered from 1'
+    trace_hdrs = HeaderTable(traces)
+    trace_hdrs['tracl'] = np.arange(1, traces + 1)
+    trace_hdrs['ns'] = ns
+    trace_hdrs['gx'] = np.arange(traces) * 2
+    with SUWriter(path) as out:
+        out.append(trace_hdrs, np.arange(traces * ns, dtype='float32'
+                                         ).reshape(traces, ns))
+
+class FailingWriter(SUWriter):
+    'writer failing on its second batch, after a delay'
+    def append(self, trace_hdrs, stream):
+        if self.traces > 0:
+            time.sleep(0.2)
+            raise IOError('disk full')
+        SUWriter.append(self, trace_hdrs, stream)
+
+class FailingReader:
+    'reader failing after its first batch'
+    traces = 6
+    def __init__(self, path):
+        self.data = SU(path)
+    def iter_traces(self, batch):
+        yield self.data.iter_traces(batch).next()
+        raise IOError('bad sector')
+
+class TestConvertStream(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.infile = os.path.join(self.dir, 'line.su')
+        self.outfile = os.path.join(self.dir, 'out.su')
+        write_su(self.infile)
+
+    def tearDown(self):
+        convert.trace_writers['su'] = SUWriter
+        shutil.rmtree(self.dir)
+
+    def run_stream(self, data, **options):
+        '''returns error of convert_stream run in a thread, fails if it does
+        not return'''
+        result = []
+        def run():
+            try:
+                convert.convert_stream(data, self.outfile, 'su', **options)
+            except Exception as error:
+                result.append(error)
+        threads = threading.active_count()
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive(), 'convert_stream did not return')
+        # the reader thread has ended
+        self.assertEqual(threading.active_count(), threads)
+        return result
+
+    def test_writer_error(self):
+        # the reader has put all batches on the full queue when the writer
+        # fails
+        convert.trace_writers['su'] = FailingWriter
+        for batch in (1, 2):
+            result = self.run_stream(SU(self.infile, lazy=True), 
+                                     batch=batch, queue_size=1)
+            self.assertEqual([str(error) for error in result], ['disk full'])
+
+    def test_reader_error(self):
+        result = self.run_stream(FailingReader(self.infile), batch=2, 
+                                 queue_size=1)
+        self.assertEqual([str(error) for error in result], ['bad sector'])
+
+    def test_convert_file(self):
+        written = os.path.join(self.dir, 'written.su')
+        SU(self.infile).write(written)
+        report = convert.convert_file(self.infile, self.outfile)
+        self.assertEqual(report['error'], None)
+        self.assertEqual((report['informat'], report['traces']), ('su', 6))
+        with open(written, 'rb') as f:
+            expected = f.read()
+        with open(self.outfile, 'rb') as f:
+            self.assertEqual(f.read(), expected)
+
+if __name__ == '__main__':
+    unittest.main()
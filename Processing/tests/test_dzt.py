@@ -0,0 +1,113 @@
+#!/bin/python env
+'''regression tests of Formats.DZT on synthetic files, run from Processing
+with >> python -m unittest discover tests'''
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from struct import pack
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+                                                             __file__))))
+from Formats.header import DZT_trace_header_format, DZT_date_format
+from Formats.tools import compile_header
+from Formats.DZT import DZT
+
+def date_word(year, month, day, hour, minute, second):
+    'returns 32 bit GSSI date word, seconds are stored in 2 s units'
+    return (second | minute << 5 | hour << 11 | day << 16 | month << 21 |
+            (year - 1980) << 25)
+
+def write_dzt(path, data, byteorder='<', data_offset=1024,
+              date=(2018, 10, 26, 13, 45, 15)):
+    'writes scans of data (scans, channels, ns) as a 16 bit DZT file'
+    scans, channels, ns = data.shape
+    hdr = {'data_offset': data_offset, 'ns': ns, 'data_bits': 16, 
+           'channel_num': channels, 'range_ns': 50., 'range': 10.,
+           'date_c': pack(byteorder + 'I', date_word(*date))}
+    header = compile_header(DZT_trace_header_format, byteorder).pack(hdr)
+    if data_offset < 1024:
+        blocks = data_offset
+    else:
+        blocks = channels
+    with open(path, 'wb') as f:
+        f.write(header.ljust(1024 * blocks, '\x00'))
+        f.write(data.astype(np.dtype('u2').newbyteorder(byteorder)
+                            ).tostring())
+
+class TestDZT(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'line.dzt')
+        # 5 scans of 2 channels of 8 samples
+        self.data = np.arange(5 * 2 * 8, dtype='u2').reshape(5, 2, 8)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_two_channels(self):
+        write_dzt(self.path, self.data)
+        data = DZT(self.path)
+        self.assertEqual(data.ns, 8)
+        self.assertEqual(data.traces, 5)
+        self.assertEqual(len(data.channels), 2)
+        self.assertTrue(np.array_equal(data.channels[0], self.data[:, 0]))
+        self.assertTrue(np.array_equal(data.channels[1], self.data[:, 1]))
+        self.assertTrue(np.array_equal(data.stream, self.data[:, 0]))
+        self.assertEqual(list(data.header('tracl')), [1, 2, 3, 4, 5])
+        self.assertEqual(list(data.header('ns')), [8] * 5)
+
+    def test_header_blocks(self):
+        # data_offset < 1024 counts 1024 byte header blocks
+        write_dzt(self.path, self.data, data_offset=3)
+        data = DZT(self.path)
+        self.assertEqual(data.traces, 5)
+        self.assertTrue(np.array_equal(data.channels[1], self.data[:, 1]))
+
+    def test_lazy_iter_traces(self):
+        write_dzt(self.path, self.data)
+        eager = DZT(self.path)
+        for channel in (0, 1):
+            batches = list(DZT(self.path, lazy=True).iter_traces(2, channel))
+            self.assertEqual([len(stream) for hdrs, stream in batches], 
+                             [2, 2, 1])
+            self.assertTrue(np.array_equal(
+                np.concatenate([stream for hdrs, stream in batches]),
+                eager.channels[channel]))
+            self.assertEqual(np.concatenate([hdrs['tracl'] for hdrs, 
+                                             stream in batches]).tolist(),
+                             eager.header('tracl').tolist())
+
+    def test_date(self):
+        write_dzt(self.path, self.data)
+        data = DZT(self.path)
+        self.assertEqual((data.year, data.day, data.hour, data.minute, 
+                          data.second), (2018, 273 + 26, 13, 45, 15))
+
+    def test_date_format(self):
+        # known date_c of 2018-11-05 10:17:44 (seconds in 2 s units), day is
+        # bits 16-20, the month bit above it is not part of the day (the 6
+        # bit day of earlier versions read day 37)
+        date_c = '\x36\x52\x65\x4d'
+        date = compile_header(DZT_date_format).unpack(date_c[::-1])
+        self.assertEqual([date[name] for name in ['year', 'month', 'day', 
+                          'hour', 'minute', 'second']], 
+                         [2018, 11, 5, 10, 17, 22])
+
+    def test_big_endian(self):
+        # byte swapped file, header values, date word and samples
+        write_dzt(self.path, self.data, '>', date=(2018, 11, 5, 10, 17, 22))
+        data = DZT(self.path, byteorder='>')
+        self.assertEqual((data.year, data.day, data.hour, data.minute, 
+                          data.second), (2018, 304 + 5, 10, 17, 22))
+        self.assertEqual(data.ns, 8)
+        self.assertTrue(np.array_equal(data.channels[1], self.data[:, 1]))
+        little = os.path.join(self.dir, 'little.dzt')
+        write_dzt(little, self.data, '<', date=(2018, 11, 5, 10, 17, 22))
+        self.assertEqual(DZT(little).header('day').tolist(), 
+                         data.header('day').tolist())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/bin/python env
+'''regression tests of Formats.IMxxx on synthetic files, run from 
+Processing with >> python -m unittest discover tests'''
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+                                                             __file__))))
+from Formats.IMxxx import Imagenix
+
+# ping of 112 header bytes, 252 data bytes and 20 bytes of zero fill
+stride = 384
+gain_byte = {'852': 38, '851': 38, '81e': 39}
+
+def make_ping(image_id, n):
+    'returns IMX ping n of image_id, header values depend on n'
+    ping = bytearray(stride)
+    ping[0:3] = image_id.upper()
+    ping[8:19] = '%02i-OCT-2018' % (20 + n)
+    ping[20:28] = '13:%02i:30' % n
+    # 'gain' -2 - n as signed byte, range 10 + n
+    ping[gain_byte[image_id]] = (-2 - n) & 0xff
+    ping[100:103] = 'IMX'
+    ping[107] = 10 + n
+    ping[112:364] = (np.arange(252) - 126 + n).astype('int8').tostring()
+    return str(ping)
+
+class TestImagenix(unittest.TestCase):
+
+    pings = 5
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, image_id):
+        path = os.path.join(self.dir, 'line.' + image_id)
+        with open(path, 'wb') as f:
+            for n in range(self.pings):
+                f.write(make_ping(image_id, n))
+        return path
+
+    def check(self, trace_hdrs, stream, first=0):
+        n = np.arange(first, first + len(stream))
+        self.assertTrue(np.array_equal(stream, (np.arange(252) - 126 + 
+                                                n[:, None]).astype('int8')))
+        self.assertEqual(stream.dtype, np.float32)
+        self.assertEqual(list(trace_hdrs['tracl']), list(n + 1))
+        self.assertEqual(list(trace_hdrs['ns']), [252] * len(n))
+        # water velocity of 1500 m/s, dt in microseconds
+        self.assertTrue(np.allclose(trace_hdrs['dt'], 
+                                    (10 + n)*2.0 / 1500 / 252 * 10**6))
+        self.assertEqual(list(trace_hdrs['gain']), list(-2 - n))
+        self.assertEqual(list(trace_hdrs['year']), [2018] * len(n))
+        self.assertEqual(list(trace_hdrs['day']), list(273 + 20 + n))
+        self.assertEqual(list(trace_hdrs['hour']), [13] * len(n))
+        self.assertEqual(list(trace_hdrs['minute']), list(n))
+        self.assertEqual(list(trace_hdrs['second']), [30] * len(n))
+
+    def test_read(self):
+        for image_id in ('852', '851', '81e'):
+            data = Imagenix(self.write(image_id))
+            self.assertEqual(data.traces, self.pings)
+            self.check(data.trace_hdrs, data.stream)
+            self.assertEqual(data.tracl, self.pings)
+
+    def test_lazy_iter_traces(self):
+        # every iteration numbers pings from 1
+        for image_id in ('852', '851', '81e'):
+            data = Imagenix(self.write(image_id), lazy=True)
+            self.assertEqual(data.traces, self.pings)
+            for repeat in range(2):
+                first = 0
+                for trace_hdrs, stream in data.iter_traces(2):
+                    self.check(trace_hdrs, stream, first)
+                    first += len(stream)
+                self.assertEqual(first, self.pings)
+
+    def test_partial_ping(self):
+        path = self.write('852')
+        with open(path, 'ab') as f:
+            f.write(make_ping('852', self.pings)[0:200])
+        self.assertEqual(Imagenix(path, lazy=True).traces, self.pings)
+        self.assertEqual(len(Imagenix(path).stream), self.pings)
+
+if __name__ == '__main__':
+    unittest.main()
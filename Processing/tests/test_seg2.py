@@ -0,0 +1,64 @@
+#!/bin/python env
+'''regression tests of Formats.SEG2 trace decoding, run from Processing 
+with >> python -m unittest discover tests'''
+import os
+import sys
+import unittest
+import numpy as np
+from struct import pack
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+                                                             __file__))))
+from Formats.SEG2 import SEG2, decode_segd20
+
+class _Instance:
+    pass
+
+def make_reader(byteorder):
+    'returns SEG2 object of byteorder without a file'
+    data = _Instance()
+    data.__class__ = SEG2
+    data.byteorder = byteorder
+    return data
+
+class TestDecodeSEGD20(unittest.TestCase):
+
+    # exponents 15, 0, 12, 7 of the 4 samples, high nibble first
+    mantissas = [1000, -1000, -32768, 32767]
+    exponents = [15, 0, 12, 7]
+    expected = [1000., -1000 * 2.**-15, -32768 * 2.**-3, 32767 * 2.**-8]
+
+    def group(self, byteorder):
+        word = sum(e << shift for e, shift in zip(self.exponents, 
+                                                  [12, 8, 4, 0]))
+        return pack(byteorder + 'H4h', word, *self.mantissas)
+
+    def test_group(self):
+        for byteorder in '<>':
+            samples = decode_segd20(self.group(byteorder), 4, 0, byteorder)
+            self.assertEqual(samples.dtype, np.float32)
+            self.assertEqual(list(samples), self.expected)
+
+    def test_offset_and_partial_group(self):
+        binary = 'xx' + self.group('>') * 2
+        samples = decode_segd20(binary, 6, 2, '>')
+        self.assertEqual(list(samples), self.expected + self.expected[0:2])
+
+class TestDecodeSamples(unittest.TestCase):
+
+    def test_signed_formats(self):
+        # formats 1 and 2 are two's complement 16 and 32 bit integers
+        for code, fmt in [(1, 'h'), (2, 'i')]:
+            values = [0, 1, -1, -1234, 1234]
+            for byteorder in '<>':
+                binary = 'x' * 4 + pack(byteorder + '5' + fmt, *values)
+                samples = make_reader(byteorder)._decode_samples(
+                              binary, code, 4, len(binary) - 4, 5)
+                self.assertEqual(samples.dtype, np.float32)
+                self.assertEqual(list(samples), values)
+
+    def test_unsupported_format(self):
+        self.assertRaises(ValueError, make_reader('<')._decode_samples,
+                          '\x00' * 8, 7, 0, 8, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/bin/python env
+'''regression tests of Formats.SEGY and IBM float decoding, run from 
+Processing with >> python -m unittest discover tests'''
+import os
+import sys
+import math
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from struct import pack
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+                                                             __file__))))
+from Formats.header import (SEGY_binary_file_header_format, 
+                            SU_trace_header_format)
+from Formats.tools import compile_header
+from Formats.SEGY import SEGY, ibm2ieee
+
+def ieee2ibm(value):
+    'returns IBM 370 float word of a value exact in 24 bit base 16 fraction'
+    if value == 0:
+        return 0
+    sign = 0x80000000 if value < 0 else 0
+    exponent = int(math.floor(math.log(abs(value), 16))) + 1
+    fraction = int(abs(value) / 16.**exponent * 2**24)
+    if fraction >= 2**24:
+        exponent += 1
+        fraction >>= 4
+    return sign | (exponent + 64) << 24 | fraction
+
+def write_ibm_segy(path, data, byteorder='>'):
+    'writes traces of data (traces, ns) as IBM float SEG-Y'
+    traces, ns = data.shape
+    # binary header format starts with the 3200 byte text header
+    binary = compile_header(SEGY_binary_file_header_format, byteorder).pack(
+                 {'ns': ns, 'dt': 250, 'data_sample_format_code': 1})
+    trace_header = compile_header(SU_trace_header_format, byteorder)
+    with open(path, 'wb') as f:
+        f.write('C 1 synthetic'.ljust(3200))
+        f.write(binary[3200:3600])
+        for n in range(traces):
+            f.write(trace_header.pack({'tracl': n + 1, 'ns': ns, 'dt': 250,
+                                       'offset': -10*n}))
+            f.write(pack(byteorder + '%iI' % ns, 
+                         *[ieee2ibm(value) for value in data[n]]))
+
+class TestIBM(unittest.TestCase):
+
+    def decode(self, word):
+        return ibm2ieee(np.array([word], dtype='u4'))[0]
+
+    def test_known_words(self):
+        for word, value in [(0x00000000, 0.), (0x41100000, 1.), 
+                            (0xc1100000, -1.), (0xc276a000, -118.625),
+                            (0x42640000, 100.), (0x40800000, 0.5),
+                            (0x3f200000, 2.**-7)]:
+            self.assertEqual(self.decode(word), value)
+            self.assertEqual(self.decode(word).dtype, np.float32)
+
+    def test_exponent_range(self):
+        # largest exponent overflows float32, largest finite is FLT_MAX
+        self.assertEqual(self.decode(0x7fffffff), np.inf)
+        self.assertEqual(self.decode(0xffffffff), -np.inf)
+        self.assertEqual(self.decode(0x60ffffff), np.finfo('f4').max)
+        self.assertEqual(self.decode(0x61100000), np.inf)
+        # smallest exponent underflows to zero
+        self.assertEqual(self.decode(0x00100000), 0.)
+        self.assertEqual(self.decode(0x80ffffff), 0.)
+
+    def test_denormal_and_underflow(self):
+        # 16**-32 = 2**-128 is a float32 denormal, 2**-152 is below them
+        self.assertEqual(self.decode(0x21100000), np.float32(2.**-128))
+        self.assertEqual(self.decode(0xa1100000), np.float32(-2.**-128))
+        self.assertEqual(self.decode(0x1b100000), 0.)
+        self.assertEqual(self.decode(0x22100000), np.float32(2.**-124))
+
+    def test_shape(self):
+        words = np.array([[0x41100000, 0xc1100000], [0, 0x42640000]], 
+                         dtype='>u4')
+        self.assertEqual(ibm2ieee(words).tolist(), [[1., -1.], [0., 100.]])
+
+class TestSEGY(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'line.sgy')
+        self.data = ((np.arange(5*16).reshape(5, 16) - 40) * 
+                     0.375).astype('float32')
+        write_ibm_segy(self.path, self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_read(self):
+        data = SEGY(self.path)
+        self.assertEqual(data.byteorder, '>')
+        self.assertEqual((data.traces, data.ns), (5, 16))
+        self.assertTrue(np.array_equal(data.stream, self.data))
+        self.assertEqual(list(data.header('tracl')), [1, 2, 3, 4, 5])
+        self.assertEqual(list(data.header('offset')), [0, -10, -20, -30, -40])
+        self.assertEqual(data.text[0:13], 'C 1 synthetic')
+
+    def test_lazy_round_trip(self):
+        eager = SEGY(self.path)
+        lazy = SEGY(self.path, lazy=True)
+        for n in range(5):
+            self.assertTrue(np.array_equal(lazy.stream[n], eager.stream[n]))
+        for field in ['tracl', 'ns', 'dt', 'offset']:
+            self.assertTrue(np.array_equal(lazy.header(field), 
+                                           eager.header(field)))
+        stream = np.concatenate([stream for hdrs, stream in 
+                                 lazy.iter_traces(2)])
+        self.assertTrue(np.array_equal(stream, self.data))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+#!/bin/python env
+'''regression tests of Formats.tools, run from Processing with
+>> python -m unittest discover tests'''
+import os
+import sys
+import unittest
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+                                                             __file__))))
+from Formats.tools import HeaderTable, set_header, set_zero
+
+def make_table(traces=5):
+    'returns header table of traces numbered 1 to traces'
+    table = HeaderTable(traces)
+    table['tracl'] = np.arange(1, traces + 1)
+    return table
+
+class TestSetHeader(unittest.TestCase):
+
+    def test_tracl_pair_updates_index(self):
+        table = make_table()
+        table.rows(3)
+        set_header(table, 'tracl', [3, 100])
+        self.assertEqual(list(table.rows(100)), [2])
+        self.assertEqual(list(table.rows(3)), [])
+
+    def test_tracl_of_traces_updates_index(self):
+        table = make_table()
+        table.rows(2)
+        set_header(table, 'tracl', 50, traces=[2])
+        self.assertEqual(list(table.rows(50)), [1])
+        set_header(table, 'gain', 7, traces=[50])
+        self.assertEqual(list(table['gain']), [0, 7, 0, 0, 0])
+
+    def test_zero_after_tracl_change(self):
+        table = make_table()
+        stream = np.ones((5, 4), dtype='float32')
+        table.rows(1)
+        set_header(table, 'tracl', [1, 10])
+        set_zero(table, stream, 10)
+        self.assertEqual(list(stream.sum(axis=1)), [0, 4, 4, 4, 4])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/bin/python env
+'''regression tests of Toolbox.utils format detection, run from Processing
+with >> python -m unittest discover tests'''
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+                                                             __file__))))
+from Toolbox.utils import fdtect, sniff, sniff_options
+from Formats.tools import HeaderTable, SUWriter, SEGYWriter
+
+def write_traces(writer, path, byteorder='=', traces=4, ns=50):
+    'writes traces of ns samples with a writer class'
+    trace_hdrs = HeaderTable(traces)
+    trace_hdrs['tracl'] = np.arange(1, traces + 1)
+    trace_hdrs['ns'] = ns
+    with writer(path, byteorder) as out:
+        out.append(trace_hdrs, np.ones((traces, ns), dtype='float32'))
+
+class TestDetection(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_fdtect_agrees_with_sniff(self):
+        for writer, ext in [(SUWriter, 'su'), (SEGYWriter, 'sgy')]:
+            for byteorder in '<>':
+                path = os.path.join(self.dir, 'line%s.%s' % (byteorder, ext))
+                write_traces(writer, path, byteorder)
+                data = fdtect(path)
+                data.testAll()
+                self.assertEqual(data.fileformat, ext)
+                self.assertEqual((data.fileformat, data.confidence), 
+                                 sniff(path))
+                self.assertEqual(sniff_options(path, ext), 
+                                 {'byteorder': byteorder})
+
+    def test_fdtect_single_format(self):
+        path = os.path.join(self.dir, 'line.sgy')
+        write_traces(SEGYWriter, path)
+        data = fdtect(path)
+        data.test4SGY()
+        self.assertTrue(data.valid)
+        self.assertEqual(data.fileformat, 'sgy')
+        data = fdtect(path)
+        data.test4DZT()
+        self.assertFalse(data.valid)
+        self.assertEqual(data.fileformat, 'none')
+
+if __name__ == '__main__':
+    unittest.main()